@@ -0,0 +1,1049 @@
+"""Modo asíncrono (ASGI) de la API de Finora, sobre Starlette y asyncpg.
+
+Expone las mismas rutas, los mismos JWT (se crean y validan con la
+configuración de 'app') y los mismos contratos JSON que app.py, pero cada
+proceso atiende muchas solicitudes concurrentes sin un hilo por cliente.
+
+Para correrlo:
+    uvicorn --factory asgi_app:create_asgi_app --port 5001
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 'asgi_app:create_asgi_app()'
+
+'asgi_app:application' (ej. 'uvicorn asgi_app:application') sigue valiendo: se crea
+con la config del entorno la primera vez que se pide.
+
+Las consultas SQL, validaciones y cálculos se reutilizan desde app.py; aquí
+solo cambia cómo se ejecutan (con 'await' sobre 'async_db').
+"""
+import asyncio
+import contextlib
+import contextvars
+import csv
+import functools
+import hashlib
+import io
+import json
+import time
+import zlib
+from datetime import datetime
+
+import asyncpg
+import jwt as pyjwt
+from flask_jwt_extended import decode_token
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.concurrency import iterate_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+import app as wsgi
+import compression
+import exports
+import idempotency
+import metrics
+import recurring
+import search
+import tokens
+from async_db import AsyncDatabase
+from passwords import HashPoolBusy, bcrypt_rounds
+
+# Se crean al iniciar la app (ver 'create_asgi_app')
+flask_app = None
+db = None
+token_versions = None
+
+
+# --- Respuestas y autenticación ---
+
+def json_response(obj, status=200, headers=None):
+    """Igual que 'jsonify': mismo serializador (fechas, orden de claves) que la app Flask."""
+    body = f"{flask_app.json.dumps(obj)}\n"
+    return Response(body, status_code=status, headers=headers, media_type='application/json')
+
+
+class JWTError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def current_claims(request, refresh=False):
+    """Valida el header Authorization como lo hace '@jwt_required()' (o '@jwt_required(refresh=True)')
+    y devuelve las claims. La revocación se verifica aparte ('token_revoked')."""
+    auth = request.headers.get('Authorization')
+    if not auth:
+        raise JWTError("Missing Authorization Header", 401)
+    header_type = flask_app.config['JWT_HEADER_TYPE']
+    parts = auth.split()
+    if len(parts) != 2 or parts[0] != header_type:
+        raise JWTError(f"Bad Authorization header. Expected 'Authorization: {header_type} <JWT>'", 422)
+    try:
+        claims = decode_token(parts[1])
+    except pyjwt.ExpiredSignatureError:
+        raise JWTError("Token has expired", 401)
+    except pyjwt.InvalidTokenError as e:
+        raise JWTError(str(e), 422)
+    if refresh and claims.get('type') != 'refresh':
+        raise JWTError("Only refresh tokens are allowed", 422)
+    if not refresh and claims.get('type') != 'access':
+        raise JWTError("Only non-refresh tokens are allowed", 422)
+    return claims
+
+
+async def current_token_version(user_id):
+    """Como 'current_token_version' de app.py, con la caché de este proceso."""
+    version = token_versions.get(user_id)
+    if version is None:
+        row = await db.query_db(tokens.BULK_QUERY, ([user_id],), one=True)
+        await db.rollback()  # Que la consulta no deje abierta la transacción del handler
+        if row is None:
+            return None
+        version = row['token_version']
+        token_versions.set(user_id, version)
+    return version
+
+
+async def refresh_token_versions(interval):
+    """Equivalente de 'tokens.VersionRefresher' con el pool de asyncpg: recarga las versiones cacheadas."""
+    while True:
+        await asyncio.sleep(interval)
+        user_ids = token_versions.user_ids()
+        if not user_ids:
+            continue
+        try:
+            async with db.request_scope():
+                rows = await db.query_db(tokens.BULK_QUERY, (user_ids,))
+        except Exception as e:
+            flask_app.logger.warning("No se pudieron recargar las versiones de token: %s", e)
+            continue
+        token_versions.update(user_ids, {row['id']: row['token_version'] for row in rows})
+
+
+def handler(protected=False, refresh=False):
+    """Envuelve un handler: conexión por solicitud y, si 'protected', verificación del JWT.
+
+    Los handlers protegidos reciben (request, user_id, claims). Con 'refresh' se exige
+    un token de refresco, cuya revocación verifica el handler contra la BD.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(request):
+            if protected:
+                try:
+                    claims = current_claims(request, refresh=refresh)
+                except JWTError as e:
+                    return json_response({"msg": str(e)}, e.status)
+            async with db.request_scope():
+                if protected:
+                    user_id = int(claims['sub'])
+                    if not refresh:
+                        try:
+                            version = await current_token_version(user_id)
+                        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError) as e:
+                            metrics.CONNECTION_ERRORS.inc()
+                            flask_app.logger.error("No se pudo verificar la versión del token: %s", e)
+                            return json_response({"error": "No se pudo conectar a la base de datos."}, 503)
+                        if tokens.is_revoked(claims, version):
+                            return json_response({"msg": "Token has been revoked"}, 401)
+                    return await fn(request, user_id, claims)
+                return await fn(request)
+        return wrapper
+    return decorator
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def accepts_gzip(headers):
+    """Igual que en app.py ('compression.negotiate'): respeta 'q=0' y '*'."""
+    accept = parse_accept_header(headers.get('Accept-Encoding'), Accept)
+    return compression.negotiate(accept, ('gzip',)) is not None
+
+
+def wants_gzip(request):
+    return accepts_gzip(request.headers)
+
+
+def cached(fn):
+    """Versión asíncrona de 'cached_response' (misma caché, mismo ETag y 304)."""
+    @functools.wraps(fn)
+    async def wrapper(request, user_id, claims):
+        cache = wsgi.get_response_cache()
+        if cache is None:
+            return await fn(request, user_id, claims)
+
+        key = cache.key(user_id, f"{request.url.path}?{request.url.query}")
+        entry = cache.get(key)
+        if entry is not None:
+            status, headers, body, etag = entry
+        else:
+            response = await fn(request, user_id, claims)
+            if response.status_code != 200 or isinstance(response, StreamingResponse):
+                return response
+            status, body = response.status_code, response.body
+            etag = hashlib.sha1(body).hexdigest()
+            headers = [(k, v) for k, v in response.headers.items() if k.lower() not in ('content-length', 'etag')]
+            cache.set(key, (status, headers, body, etag))
+
+        quoted = f'"{etag}"'
+        extra = {'ETag': quoted, 'Cache-Control': 'private, no-cache'}
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or quoted in
+                              [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]):
+            return Response(status_code=304, headers=extra)
+        response = Response(body, status_code=status)
+        for k, v in headers:
+            response.headers[k] = v
+        response.headers.update(extra)
+        return response
+    return wrapper
+
+
+async def idempotency_body(request):
+    """Como 'idempotency_body' de app.py. Starlette guarda el cuerpo y el formulario: el handler puede volver a leerlos."""
+    if not request.headers.get('Content-Type', '').startswith('multipart/form-data'):
+        return await request.body()
+    files = []
+    for name, upload in (await request.form()).multi_items():
+        if hasattr(upload, 'read'):
+            files.append((name, await upload.read()))
+            await upload.seek(0)
+    return idempotency.multipart_body(files)
+
+
+def idempotent(fn):
+    """Versión asíncrona de 'idempotent' de app.py (misma tabla, mismas respuestas)."""
+    @functools.wraps(fn)
+    async def wrapper(request, user_id, claims):
+        key = request.headers.get(idempotency.HEADER)
+        if key is None:
+            return await fn(request, user_id, claims)
+        try:
+            idempotency.validate_key(key)
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400)
+
+        key_hash = idempotency.key_hash(key)
+        request_hash = idempotency.request_hash(request.method, request.url.path, await idempotency_body(request))
+        try:
+            claimed = await db.query_db(idempotency.CLAIM_QUERY,
+                                        (user_id, key_hash, request_hash, flask_app.config['IDEMPOTENCY_TTL']),
+                                        one=True)
+            if claimed is None:
+                stored = await db.query_db(idempotency.LOOKUP_QUERY, (user_id, key_hash), one=True)
+                await db.rollback()
+                status, body = idempotency.replay(stored, request_hash)
+                if isinstance(body, dict):
+                    return json_response(body, status)
+                return Response(body, status_code=status, media_type='application/json',
+                                headers={idempotency.REPLAY_HEADER: 'true'})
+        except Exception as e:
+            await db.rollback()
+            return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+
+        response = await fn(request, user_id, claims)
+        if db.in_transaction():
+            await db.rollback()  # El handler no confirmó nada: la clave se descarta
+            return response
+        if response.status_code < 400:
+            try:
+                await db.query_db(idempotency.STORE_QUERY,
+                                  (response.status_code, idempotency.encode_body(response.body), user_id, key_hash),
+                                  commit=True)
+            except Exception as e:
+                await db.rollback()
+                flask_app.logger.error("No se pudo guardar la respuesta de la Idempotency-Key: %s", e)
+        return response
+    return wrapper
+
+
+async def hash_password(password):
+    rounds = flask_app.config['BCRYPT_LOG_ROUNDS']
+    hashed = await wsgi.get_hash_pool().run_async(wsgi.bcrypt.generate_password_hash, password, rounds)
+    return hashed.decode('utf-8')
+
+
+async def check_password(password_hash, password):
+    return await wsgi.get_hash_pool().run_async(wsgi.bcrypt.check_password_hash, password_hash, password)
+
+
+async def apply_balance_delta(user_id, type_, delta, currency):
+    args = {"user_id": user_id, "type": type_, "delta": delta, "currency": currency}
+    await db.query_db(wsgi.BALANCE_DELTA_QUERY, args)
+
+
+async def apply_rollup_delta(user_id, type_, category, date, delta, count, currency):
+    args = {"user_id": user_id, "type": type_, "category": category, "date": date,
+            "delta": delta, "count": count, "currency": currency}
+    await db.query_db(wsgi.ROLLUP_DELTA_QUERY, args)
+
+
+async def exchange_rates():
+    """Equivalente de 'wsgi.exchange_rates' (comparte la caché de tasas del proceso)."""
+    import rates
+    cache = wsgi.get_rate_cache()
+    if cache.check_due():
+        version = (await db.query_db(rates.VERSION_QUERY, one=True))['version']
+        if cache.outdated(version):
+            cache.load(version, await db.query_db(rates.RATES_QUERY))
+    return cache.table
+
+
+# --- 1. Autenticación y Autorización ---
+
+@handler()
+async def register(request):
+    try:
+        data = await request.json()
+        username = data['username']
+        password = data['password']
+
+        if not username or not password:
+            return json_response({"error": "Usuario y contraseña requeridos"}, 400)
+
+        hashed_password = await hash_password(password)
+        query = "INSERT INTO users (username, password_hash, role) VALUES (%s, %s, %s)"
+        await db.query_db(query, (username, hashed_password, 'user'), commit=True)
+
+        return json_response({"message": f"Usuario {username} registrado exitosamente"}, 201)
+
+    except asyncpg.UniqueViolationError:
+        return json_response({"error": "El nombre de usuario ya existe"}, 409)
+    except HashPoolBusy:
+        return json_response({"error": "Servidor ocupado, intenta de nuevo"}, 503)
+    except Exception as e:
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 400)
+
+
+@handler()
+async def login(request):
+    try:
+        data = await request.json()
+        username = data.get('username')
+        password = data.get('password')
+
+        if not username or not password:
+            return json_response({"error": "Usuario y contraseña requeridos"}, 400)
+
+        locked_for = wsgi.get_login_limiter().locked_for(username)
+        if locked_for:
+            return json_response({"error": "Demasiados intentos fallidos. Intenta más tarde."}, 429,
+                                 headers={'Retry-After': str(int(locked_for) + 1)})
+
+        user = await db.query_db("SELECT id, password_hash, role, token_version FROM users WHERE username = %s",
+                                 (username,), one=True)
+
+        valid = False
+        if user:
+            valid = wsgi.get_login_cache().check(username, user['password_hash'], password)
+            if not valid:
+                valid = await check_password(user['password_hash'], password)
+                if valid:
+                    wsgi.get_login_cache().add(username, user['password_hash'], password)
+
+        if not valid:
+            wsgi.get_login_limiter().record_failure(username)
+            return json_response({"error": "Credenciales inválidas"}, 401)
+
+        wsgi.get_login_limiter().reset(username)
+        if bcrypt_rounds(user['password_hash']) != flask_app.config['BCRYPT_LOG_ROUNDS']:
+            new_hash = await hash_password(password)
+            await db.query_db("UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                              (new_hash, user['id'], user['password_hash']), commit=True)
+            wsgi.get_login_cache().discard(username)
+
+        body = wsgi.issue_tokens(user['id'], user['role'], user['token_version'])
+        return json_response(body, 200)
+
+    except HashPoolBusy:
+        return json_response({"error": "Servidor ocupado, intenta de nuevo"}, 503)
+    except Exception as e:
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+
+
+@handler(protected=True, refresh=True)
+async def refresh(request, user_id, claims):
+    try:
+        user = await db.query_db("SELECT role, token_version FROM users WHERE id = %s", (user_id,), one=True)
+    except Exception as e:
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+    if tokens.is_revoked(claims, user['token_version'] if user else None):
+        return json_response({"msg": "Token has been revoked"}, 401)
+    token_versions.set(user_id, user['token_version'])
+    body = wsgi.issue_tokens(user_id, user['role'], user['token_version'], refresh=False)
+    return json_response(body, 200)
+
+
+@handler(protected=True)
+async def logout(request, user_id, claims):
+    try:
+        row = await db.query_db(tokens.REVOKE_QUERY, (user_id,), one=True)
+        await db.commit()
+        token_versions.set(user_id, row['token_version'])
+        return json_response({"message": "Sesión cerrada"}, 200)
+    except Exception as e:
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+
+
+# --- 2. Transacciones y Balance ---
+
+@handler(protected=True)
+@idempotent
+async def add_transaction(request, user_id, claims):
+    try:
+        data = await request.json()
+        table = await exchange_rates()
+        try:
+            type_, amount, category, description, _, currency = wsgi.parse_transaction(
+                data, currencies=lambda: table.currencies)
+        except ValueError as e:
+            await db.rollback()
+            return json_response({"error": str(e)}, 400)
+
+        date = datetime.now()
+        args = (user_id, type_, amount, category, description, date, currency)
+        await db.query_db(wsgi.INSERT_TRANSACTION_QUERY, args, one=True)
+        await apply_balance_delta(user_id, type_, amount, currency)
+        await apply_rollup_delta(user_id, type_, category, date, amount, 1, currency)
+        await db.commit()
+        wsgi.record_user_write(user_id)
+
+        return json_response({"message": "Transacción registrada exitosamente"}, 201)
+
+    except Exception as e:
+        await db.rollback()
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 400)
+
+
+@handler(protected=True)
+async def update_transaction(request, user_id, claims):
+    transaction_id = request.path_params['transaction_id']
+    try:
+        data = await request.json()
+        amount = wsgi.parse_amount(data['amount'])
+        category = data['category']
+        description = data.get('description', '')
+
+        if amount <= 0:
+            return json_response({"error": "El monto debe ser positivo"}, 400)
+
+        args = (amount, category, description, transaction_id, user_id)
+        result = await db.query_db(wsgi.UPDATE_TRANSACTION_QUERY, args, one=True)
+        if result:
+            await apply_balance_delta(user_id, result['type'], result['amount'] - result['old_amount'],
+                                      result['currency'])
+            for category_, delta, count in wsgi.rollup_changes(result):
+                await apply_rollup_delta(user_id, result['type'], category_, result['date'], delta, count,
+                                         result['currency'])
+        await db.commit()
+
+        if result:
+            wsgi.record_user_write(user_id)
+            return json_response({"message": "Transacción actualizada exitosamente"}, 200)
+        return json_response({"error": "Transacción no encontrada o no pertenece al usuario"}, 404)
+
+    except Exception as e:
+        await db.rollback()
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 400)
+
+
+@handler(protected=True)
+async def delete_transaction(request, user_id, claims):
+    transaction_id = request.path_params['transaction_id']
+    try:
+        result = await db.query_db(wsgi.DELETE_TRANSACTION_QUERY, (transaction_id, user_id), one=True)
+        if result:
+            await apply_balance_delta(user_id, result['type'], -result['amount'], result['currency'])
+            await apply_rollup_delta(user_id, result['type'], result['category'], result['date'],
+                                     -result['amount'], -1, result['currency'])
+        await db.commit()
+
+        if result:
+            wsgi.record_user_write(user_id)
+            return json_response({"message": "Transacción eliminada exitosamente"}, 200)
+        return json_response({"error": "Transacción no encontrada o no pertenece al usuario"}, 404)
+
+    except Exception as e:
+        await db.rollback()
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+
+
+async def stream_transactions(query, args):
+    yield "["
+    first = True
+    async for row in db.iterate(query, args, prefetch=wsgi.STREAM_FETCH_SIZE):
+        yield ("" if first else ",") + flask_app.json.dumps(dict(row))
+        first = False
+    yield "]"
+
+
+@handler(protected=True)
+@cached
+async def get_transactions(request, user_id, claims):
+    params = request.query_params
+    try:
+        query, args, limit = wsgi.build_transactions_query(user_id, params)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    try:
+        if limit is None and wsgi.wants_stream(params):
+            return StreamingResponse(stream_transactions(query, args), media_type='application/json')
+
+        transactions = await db.query_db(query, args)
+        if limit is not None:
+            transactions, next_cursor = wsgi.split_page(transactions, limit)
+            headers = {'X-Next-Cursor': next_cursor} if next_cursor else None
+            return json_response(transactions, 200, headers=headers)
+        return json_response(transactions, 200)
+    except Exception as e:
+        return json_response({"error": f"Error al obtener transacciones: {str(e)}"}, 500)
+
+
+_search_trigrams = None
+
+
+@handler(protected=True)
+@cached
+async def search_transactions(request, user_id, claims):
+    global _search_trigrams
+    if _search_trigrams is None:
+        _search_trigrams = await db.query_db(search.TRIGRAM_INDEX_QUERY, one=True) is not None
+    try:
+        query, args, facets_query, limit = wsgi.build_search(user_id, request.query_params, _search_trigrams)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    try:
+        rows = await db.query_db(query, args)
+        facets = await db.query_db(*facets_query) if facets_query else None
+        body = wsgi.search_response_body(rows, limit, facets)
+        headers = {'X-Next-Cursor': body['next_cursor']} if body['next_cursor'] else None
+        return json_response(body, 200, headers=headers)
+    except Exception as e:
+        return json_response({"error": f"Error al buscar transacciones: {str(e)}"}, 500)
+
+
+@handler(protected=True)
+@cached
+async def get_balance(request, user_id, claims):
+    try:
+        table = await exchange_rates()
+        currency = wsgi.requested_currency(request.query_params, lambda: table.currencies)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    try:
+        rows = await db.query_db(wsgi.BALANCES_QUERY, (user_id,))
+        return json_response(wsgi.balance_body(table, rows, currency, request.query_params), 200)
+    except Exception as e:
+        return json_response({"error": f"Error al calcular el balance: {str(e)}"}, 500)
+
+
+# --- 3. Exportación / Integración y Reportes ---
+
+async def generate_csv(query, args):
+    si = io.StringIO()
+    writer = csv.writer(si)
+    writer.writerow(wsgi.EXPORT_COLUMNS)
+    async for row in db.iterate(query, args, prefetch=wsgi.STREAM_FETCH_SIZE):
+        writer.writerow(row.values())
+        if si.tell() >= wsgi.EXPORT_CHUNK_SIZE:
+            yield si.getvalue()
+            si.seek(0)
+            si.truncate()
+    if si.tell():
+        yield si.getvalue()
+
+
+async def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@handler(protected=True)
+async def export_csv(request, user_id, claims):
+    try:
+        where, args = wsgi.transaction_filters(user_id, request.query_params)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    try:
+        if await db.query_db(f"SELECT 1 FROM transactions WHERE {where} LIMIT 1", tuple(args), one=True) is None:
+            return json_response({"message": "No hay transacciones para exportar"}, 404)
+
+        query = (f"SELECT {', '.join(wsgi.EXPORT_COLUMNS)} FROM transactions WHERE {where} "
+                 "ORDER BY date DESC, id DESC")
+        body = generate_csv(query, tuple(args))
+        headers = {"Content-disposition": f"attachment; filename=finora_export_{datetime.now().date()}.csv",
+                   "Vary": "Accept-Encoding"}
+        if wants_gzip(request):
+            body = gzip_stream(body)
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(body, media_type="text/csv", headers=headers)
+    except Exception as e:
+        return json_response({"error": f"Error al exportar CSV: {str(e)}"}, 500)
+
+
+@handler(protected=True)
+async def create_export(request, user_id, claims):
+    try:
+        params = wsgi.export_params(request.query_params)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    limit = flask_app.config['EXPORT_MAX_ACTIVE_PER_USER']
+    try:
+        await db.query_db(exports.ENQUEUE_LOCK_QUERY, (exports.ENQUEUE_LOCK_KEY, user_id))
+        if (await db.query_db(exports.ACTIVE_QUERY, (user_id,), one=True))['active'] >= limit:
+            await db.rollback()
+            return json_response({"error": f"Ya tienes {limit} exportación(es) en curso. Intenta más tarde."}, 429)
+        job = await db.query_db(exports.INSERT_QUERY, (user_id, 'transactions_csv', json.dumps(params)), one=True)
+        await db.commit()
+    except Exception as e:
+        return json_response({"error": f"Error al encolar la exportación: {str(e)}"}, 500)
+    return json_response(wsgi.export_status(job), 202, headers={'Location': f"/exports/{job['id']}"})
+
+
+@handler(protected=True)
+async def get_export(request, user_id, claims):
+    try:
+        job = await db.query_db(exports.STATUS_QUERY, (request.path_params['job_id'], user_id), one=True)
+    except Exception as e:
+        return json_response({"error": f"Error al consultar la exportación: {str(e)}"}, 500)
+    if job is None:
+        return json_response({"error": "La exportación no existe o ya expiró"}, 404)
+    if job['status'] in ('pending', 'running'):
+        retry_after = str(max(1, int(flask_app.config['EXPORT_POLL_INTERVAL'])))
+        return json_response(wsgi.export_status(job), 202, headers={'Retry-After': retry_after})
+    if job['status'] == 'failed':
+        return json_response(wsgi.export_status(job), 500)
+
+    accept_gzip = wants_gzip(request)
+    try:
+        f = wsgi.open_export_file(job, accept_gzip)
+    except FileNotFoundError:
+        return json_response({"error": "La exportación no existe o ya expiró"}, 404)
+    headers = {"Content-disposition": f"attachment; filename={wsgi.export_download_name(job)}",
+               "Vary": "Accept-Encoding"}
+    if accept_gzip:
+        headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(job['file_size'])
+    # La lectura del disco va a un hilo para no bloquear el event loop
+    return StreamingResponse(iterate_in_threadpool(wsgi.export_file_chunks(f)), media_type="text/csv",
+                             headers=headers)
+
+
+# 'execute_values' no existe en asyncpg: el lote viaja como arreglos por columna
+BULK_INSERT_QUERY = wsgi.bulk_insert_query(
+    rows="SELECT * FROM unnest($1::integer[], $2::text[], $3::numeric[], $4::text[], $5::text[], "
+         "$6::timestamp[], $7::text[])",
+)
+
+
+async def bulk_insert_transactions(user_id, rows):
+    table = await exchange_rates()
+    valid, errors = wsgi.validate_bulk_rows(user_id, rows, currencies=lambda: table.currencies)
+    if valid:
+        try:
+            await db.query_db(BULK_INSERT_QUERY, [list(column) for column in zip(*valid)], commit=True)
+        except Exception:
+            await db.rollback()
+            raise
+        wsgi.record_user_write(user_id)
+    return len(valid), errors
+
+
+def bulk_response(inserted, errors):
+    body = {"inserted": inserted, "errors": errors}
+    if inserted == 0 and errors:
+        body["error"] = "Ninguna fila es válida"
+        return json_response(body, 400)
+    return json_response(body, 201)
+
+
+@handler(protected=True)
+@idempotent
+async def bulk_transactions(request, user_id, claims):
+    data = await read_json(request)
+    if not isinstance(data, list):
+        return json_response({"error": "Se esperaba un arreglo JSON de transacciones"}, 400)
+    try:
+        inserted, errors = await bulk_insert_transactions(user_id, enumerate(data))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    except Exception as e:
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+    return bulk_response(inserted, errors)
+
+
+@handler(protected=True)
+@idempotent
+async def import_csv(request, user_id, claims):
+    if request.headers.get('Content-Type', '').startswith('multipart/form-data'):
+        form = await request.form()
+        upload = form.get('file')
+        raw = await upload.read() if upload is not None and hasattr(upload, 'read') else b''
+    else:
+        raw = await request.body()
+
+    try:
+        stream = io.StringIO(raw.decode('utf-8-sig'), newline='')
+        reader = csv.DictReader(stream)
+        missing = {'type', 'amount', 'category'} - set(reader.fieldnames or [])
+        if missing:
+            return json_response({"error": f"Faltan columnas en el CSV: {', '.join(sorted(missing))}"}, 400)
+
+        rows = ((reader.line_num, row) for row in reader)
+        inserted, errors = await bulk_insert_transactions(user_id, rows)
+    except (ValueError, csv.Error, UnicodeDecodeError) as e:
+        return json_response({"error": f"CSV inválido: {str(e)}"}, 400)
+    except Exception as e:
+        return json_response({"error": f"Error al importar CSV: {str(e)}"}, 500)
+    return bulk_response(inserted, errors)
+
+
+@handler(protected=True)
+async def create_recurring(request, user_id, claims):
+    data = await read_json(request)
+    if not isinstance(data, dict):
+        return json_response({"error": "Se esperaba un objeto JSON"}, 400)
+    try:
+        table = await exchange_rates()
+        type_, amount, category, description, _, currency = wsgi.parse_transaction(
+            data, currencies=lambda: table.currencies)
+        frequency, interval, start_date, end_date = recurring.parse_rule(data)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    limit = flask_app.config['RECURRING_MAX_RULES_PER_USER']
+    try:
+        count = await db.query_db("SELECT count(*) AS count FROM recurring_rules WHERE user_id = %s", (user_id,), one=True)
+        if count['count'] >= limit:
+            await db.rollback()
+            return json_response({"error": f"Se alcanzó el máximo de {limit} reglas recurrentes"}, 400)
+        rule = await db.query_db(recurring.INSERT_QUERY, (user_id, type_, amount, currency, category, description,
+                                                          frequency, interval, start_date, end_date, start_date),
+                                 one=True)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+    return json_response(recurring.rule_json(rule), 201)
+
+
+@handler(protected=True)
+async def list_recurring(request, user_id, claims):
+    try:
+        rules = await db.query_db(recurring.LIST_QUERY, (user_id,))
+    except Exception as e:
+        return json_response({"error": f"Error al obtener las reglas: {str(e)}"}, 500)
+    return json_response([recurring.rule_json(rule) for rule in rules], 200)
+
+
+@handler(protected=True)
+async def delete_recurring(request, user_id, claims):
+    try:
+        deleted = await db.query_db(recurring.DELETE_QUERY, (request.path_params['rule_id'], user_id), one=True)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+    if deleted is None:
+        return json_response({"error": "Regla no encontrada o no pertenece al usuario"}, 404)
+    return json_response({"message": "Regla eliminada exitosamente"}, 200)
+
+
+async def monthly_summary(table, user_id, start_month, end_month, currency):
+    query, args = wsgi.monthly_summary_query(user_id, start_month, end_month)
+    return wsgi.group_months(wsgi.convert_monthly_totals(table, await db.query_db(query, args), currency))
+
+
+@handler(protected=True)
+@cached
+async def reports_summary(request, user_id, claims):
+    try:
+        start_month, end_month = wsgi.parse_month_range(request.query_params)
+        table = await exchange_rates()
+        currency = wsgi.requested_currency(request.query_params, lambda: table.currencies)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    try:
+        months = await monthly_summary(table, user_id, start_month, end_month, currency)
+        report = wsgi.summary_report(months)
+        if request.query_params.get('currency'):
+            report["currency"] = currency
+        return json_response(report, 200)
+    except Exception as e:
+        return json_response({"error": f"Error al generar el reporte: {str(e)}"}, 500)
+
+
+@handler(protected=True)
+async def create_goal(request, user_id, claims):
+    data = await read_json(request)
+    if not isinstance(data, dict):
+        return json_response({"error": "Se esperaba un objeto JSON"}, 400)
+    try:
+        name, target_amount, target_date = wsgi.parse_savings_goal(data)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    try:
+        count = await db.query_db("SELECT count(*) AS count FROM savings_goals WHERE user_id = %s", (user_id,), one=True)
+        if count['count'] >= wsgi.MAX_GOALS_PER_USER:
+            await db.rollback()
+            return json_response({"error": f"Se alcanzó el máximo de {wsgi.MAX_GOALS_PER_USER} metas"}, 400)
+        goal = await db.query_db(wsgi.INSERT_GOAL_QUERY, (user_id, name, target_amount, target_date), one=True)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+    wsgi.record_user_write(user_id)
+    return json_response(goal, 201)
+
+
+@handler(protected=True)
+async def list_goals(request, user_id, claims):
+    try:
+        goals = await db.query_db(wsgi.GOALS_QUERY, (user_id,))
+    except Exception as e:
+        return json_response({"error": f"Error al obtener las metas: {str(e)}"}, 500)
+    return json_response(goals, 200)
+
+
+@handler(protected=True)
+async def delete_goal(request, user_id, claims):
+    try:
+        deleted = await db.query_db(wsgi.DELETE_GOAL_QUERY, (request.path_params['goal_id'], user_id), one=True)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        return json_response({"error": f"Error al procesar la solicitud: {str(e)}"}, 500)
+    if deleted is None:
+        return json_response({"error": "Meta no encontrada o no pertenece al usuario"}, 404)
+    wsgi.record_user_write(user_id)
+    return json_response({"message": "Meta eliminada exitosamente"}, 200)
+
+
+def premium(fn):
+    """Equivalente de 'premium_required': va arriba de '@cached'."""
+    @functools.wraps(fn)
+    async def wrapper(request, user_id, claims):
+        if claims.get('role', 'user') != 'premium':
+            return json_response({"error": "Acceso denegado. Se requiere suscripción Premium."}, 403)
+        return await fn(request, user_id, claims)
+    return wrapper
+
+
+@handler(protected=True)
+@premium
+@cached
+async def premium_report(request, user_id, claims):
+    try:
+        goal = wsgi.parse_goal(request.query_params)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    try:
+        import forecast  # Como en app.py: NumPy se carga con el primer reporte
+        month = wsgi.forecast_month()
+        table = await exchange_rates()
+        model = wsgi.stored_forecast_model(await db.query_db(wsgi.FORECAST_QUERY, (user_id, month), one=True))
+        if model is None:
+            rows = await db.query_db(forecast.HISTORY_QUERY, (user_id, *forecast.history_range(month)))
+            model = forecast.build_model(wsgi.forecast_history(table, rows), month)
+        balances = await db.query_db(wsgi.BALANCES_QUERY, (user_id,))
+        total_income, total_expense = wsgi.convert_balances(table, balances, flask_app.config['BASE_CURRENCY'])
+        goals = await db.query_db(wsgi.GOALS_QUERY, (user_id,))
+        report = forecast.project(model, total_income - total_expense, month, goal, goals)
+        return json_response(report, 200)
+    except Exception as e:
+        return json_response({"error": f"Error al generar el reporte: {str(e)}"}, 500)
+
+
+# --- Métricas ---
+
+# Estado de la solicitud en curso para las métricas: {'scope', 'queries', 'status'}
+_request_metrics = contextvars.ContextVar('finora_request_metrics', default=None)
+
+
+def metrics_endpoint_name(scope):
+    """Mismo valor que la etiqueta 'endpoint' de Flask: el nombre de la función de la ruta."""
+    return getattr(scope.get('endpoint'), '__name__', 'not_found')
+
+
+class AppContextMiddleware:
+    """Atiende cada solicitud dentro del contexto de la app Flask: las funciones de app.py
+    que se reutilizan leen la config con 'current_app'."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        with flask_app.app_context():
+            await self.app(scope, receive, send)
+
+
+class NegotiatedGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware que no comprime si el cliente rechaza gzip ('gzip;q=0'): el de
+    Starlette solo busca 'gzip' en el header."""
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and not accepts_gzip(Headers(scope=scope)):
+            return await self.app(scope, receive, send)
+        await super().__call__(scope, receive, send)
+
+
+class RequestMetricsMiddleware:
+    """Equivalente de 'finish_request_metrics': mide la solicitud hasta enviar el último byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not flask_app.config['METRICS_ENABLED']:
+            return await self.app(scope, receive, send)
+
+        state = {'scope': scope, 'queries': 0, 'status': 500}
+        token = _request_metrics.set(state)
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_metrics.reset(token)
+            metrics.record_request(metrics_endpoint_name(scope), scope['method'], state['status'],
+                                   time.perf_counter() - started, state['queries'])
+
+
+def record_query(query, args, elapsed, rows, error):
+    """Gancho 'on_query' de AsyncDatabase (ver 'record_query' en app.py)."""
+    if not flask_app.config['METRICS_ENABLED']:
+        return
+    state = _request_metrics.get()
+    endpoint = 'cli'
+    if state is not None:
+        state['queries'] += 1
+        endpoint = metrics_endpoint_name(state['scope'])
+    metrics.record_query(endpoint, query, args, elapsed, rows=rows, error=error,
+                         slow_threshold=flask_app.config['SLOW_QUERY_MS'] / 1000)
+
+
+def record_acquire(elapsed, error):
+    """Gancho 'on_acquire' de AsyncDatabase."""
+    if error:
+        metrics.CONNECTION_ERRORS.inc()
+    elif flask_app.config['METRICS_ENABLED']:
+        metrics.CONNECTION_WAIT.observe(elapsed)
+
+
+def collect_pool_metrics():
+    if db is None or db.pool is None:
+        return []
+    size, idle = db.pool.get_size(), db.pool.get_idle_size()
+    return [('finora_db_pool_connections', 'gauge', "Conexiones del pool por estado.",
+             [({'state': 'in_use'}, size - idle), ({'state': 'idle'}, idle)])]
+
+
+metrics.REGISTRY.add_collector(collect_pool_metrics)
+
+
+async def get_metrics(request):
+    if not flask_app.config['METRICS_ENABLED']:
+        return json_response({"error": "Métricas desactivadas"}, 404)
+    if not wsgi.metrics_response_allowed(request.headers.get('Authorization')):
+        return json_response({"error": "No autorizado"}, 401)
+    return Response(metrics.REGISTRY.render(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+
+# --- Aplicación ---
+
+routes = [
+    Route('/register', register, methods=['POST']),
+    Route('/login', login, methods=['POST']),
+    Route('/refresh', refresh, methods=['POST']),
+    Route('/logout', logout, methods=['POST']),
+    Route('/transaction', add_transaction, methods=['POST']),
+    Route('/transaction/{transaction_id:int}', update_transaction, methods=['PUT']),
+    Route('/transaction/{transaction_id:int}', delete_transaction, methods=['DELETE']),
+    Route('/transactions', get_transactions, methods=['GET']),
+    Route('/transactions/search', search_transactions, methods=['GET']),
+    Route('/transactions/bulk', bulk_transactions, methods=['POST']),
+    Route('/balance', get_balance, methods=['GET']),
+    Route('/export/csv', export_csv, methods=['GET']),
+    Route('/import/csv', import_csv, methods=['POST']),
+    Route('/recurring', create_recurring, methods=['POST']),
+    Route('/recurring', list_recurring, methods=['GET']),
+    Route('/recurring/{rule_id:int}', delete_recurring, methods=['DELETE']),
+    Route('/exports', create_export, methods=['POST']),
+    Route('/exports/{job_id:int}', get_export, methods=['GET']),
+    Route('/reports/summary', reports_summary, methods=['GET']),
+    Route('/goals', create_goal, methods=['POST']),
+    Route('/goals', list_goals, methods=['GET']),
+    Route('/goals/{goal_id:int}', delete_goal, methods=['DELETE']),
+    Route('/premium_report', premium_report, methods=['GET']),
+    Route('/metrics', get_metrics, methods=['GET']),
+]
+
+
+def create_asgi_app(app=None):
+    """Crea la app ASGI sobre la app Flask 'app' (por defecto, 'wsgi.create_app()'), de la
+    que toma la config. El pool de asyncpg se abre al iniciar (lifespan), en cada worker."""
+    global flask_app
+    flask_app = app if app is not None else wsgi.create_app()
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_):
+        global db, token_versions
+        config = flask_app.config
+        token_versions = tokens.TokenVersionCache(ttl=config['TOKEN_VERSION_TTL'])
+        db = AsyncDatabase(
+            config['DATABASE_URL'],
+            min_size=config['DB_POOL_MIN_SIZE'],
+            max_size=config['DB_POOL_MAX_SIZE'],
+            timeout=config['DB_POOL_TIMEOUT'],
+            on_query=record_query,
+            on_acquire=record_acquire,
+        )
+        await db.connect()
+        refresher = None
+        if config['TOKEN_VERSION_REFRESH'] > 0:
+            refresher = asyncio.create_task(refresh_token_versions(config['TOKEN_VERSION_REFRESH']))
+        try:
+            yield
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+            await db.close()
+
+    middleware = [Middleware(AppContextMiddleware), Middleware(RequestMetricsMiddleware),
+                  Middleware(CORSMiddleware, allow_origins=['*'])]
+    if flask_app.config['COMPRESS_MIN_BYTES'] > 0:
+        # Solo gzip (Starlette no trae brotli); respeta las respuestas que ya traen Content-Encoding
+        middleware.append(Middleware(NegotiatedGZipMiddleware, minimum_size=flask_app.config['COMPRESS_MIN_BYTES'],
+                                     compresslevel=flask_app.config['COMPRESS_LEVEL']))
+    return Starlette(routes=routes, lifespan=lifespan, middleware=middleware)
+
+
+def __getattr__(name):
+    """'application' se crea recién cuando se pide (importar el módulo no crea la app)."""
+    if name == 'application':
+        globals()['application'] = create_asgi_app()
+        return globals()['application']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,178 @@
+"""Capa de datos asíncrona (asyncpg) para el modo ASGI, ver asgi_app.py.
+
+'query_db' imita al de app.py: recibe las mismas consultas con placeholders de
+psycopg2 ('%s' y '%(nombre)s'), abre una transacción implícita en la primera
+consulta de la solicitud y solo confirma con commit=True (o 'commit()').
+"""
+import contextvars
+import functools
+import re
+import time
+
+import asyncpg
+
+
+class AsyncDatabase:
+    """Pool de asyncpg más la conexión/transacción de la solicitud en curso."""
+
+    def __init__(self, dsn, min_size=1, max_size=10, timeout=5.0, max_inactive_lifetime=300.0,
+                 on_query=None, on_acquire=None):
+        """'on_query(query, args, elapsed, rows, error)' y 'on_acquire(elapsed, error)' son
+        ganchos opcionales para métricas (ver asgi_app.py)."""
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_inactive_lifetime = max_inactive_lifetime
+        self.pool = None
+        self.on_query = on_query
+        self.on_acquire = on_acquire
+        self._current = contextvars.ContextVar('finora_async_db', default=None)
+
+    async def connect(self):
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(
+                self.dsn,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                max_inactive_connection_lifetime=self.max_inactive_lifetime,
+            )
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    # --- Conexión por solicitud ---
+
+    def request_scope(self):
+        """Context manager: la conexión se toma en la primera consulta y se devuelve al salir."""
+        return _RequestScope(self)
+
+    async def _state(self):
+        state = self._current.get()
+        if state is None:
+            raise RuntimeError("query_db usado fuera de 'request_scope()'")
+        if state['conn'] is None:
+            started = time.perf_counter()
+            try:
+                state['conn'] = await self.pool.acquire(timeout=self.timeout)
+            except Exception:
+                if self.on_acquire:
+                    self.on_acquire(time.perf_counter() - started, True)
+                raise
+            if self.on_acquire:
+                self.on_acquire(time.perf_counter() - started, False)
+        if state['tx'] is None:
+            state['tx'] = state['conn'].transaction()
+            await state['tx'].start()
+        return state
+
+    async def query_db(self, query, args=(), one=False, commit=False):
+        """Equivalente asíncrono de 'query_db' de app.py. Devuelve dicts."""
+        state = await self._state()
+        sql, values = to_asyncpg(query, args)
+        started = time.perf_counter()
+        try:
+            if one:
+                row = await state['conn'].fetchrow(sql, *values)
+                rv = dict(row) if row is not None else None
+            else:
+                rv = [dict(row) for row in await state['conn'].fetch(sql, *values)]
+        except Exception:
+            if self.on_query:
+                self.on_query(query, args, time.perf_counter() - started, None, True)
+            raise
+        if self.on_query:
+            rows = len(rv) if isinstance(rv, list) else int(rv is not None)
+            self.on_query(query, args, time.perf_counter() - started, rows, False)
+        if commit:
+            await self.commit()
+            return None
+        return rv
+
+    async def commit(self):
+        state = self._current.get()
+        if state and state['tx'] is not None:
+            tx, state['tx'] = state['tx'], None
+            await tx.commit()
+
+    async def rollback(self):
+        state = self._current.get()
+        if state and state['tx'] is not None:
+            tx, state['tx'] = state['tx'], None
+            await tx.rollback()
+
+    def in_transaction(self):
+        """True si la solicitud tiene una transacción abierta (consultas sin confirmar)."""
+        state = self._current.get()
+        return bool(state and state['tx'] is not None)
+
+    async def iterate(self, query, args=(), prefetch=500):
+        """Recorre un resultado con un cursor del servidor, en su propia conexión.
+
+        Pensado para respuestas en streaming, que se consumen después de que
+        termina el handler (y con él la conexión de la solicitud).
+        """
+        sql, values = to_asyncpg(query, args)
+        async with self.pool.acquire(timeout=self.timeout) as conn:
+            async with conn.transaction(readonly=True):
+                async for row in conn.cursor(sql, *values, prefetch=prefetch):
+                    yield row
+
+
+class _RequestScope:
+    def __init__(self, db):
+        self.db = db
+        self.token = None
+
+    async def __aenter__(self):
+        self.token = self.db._current.set({'conn': None, 'tx': None})
+        return self.db
+
+    async def __aexit__(self, *exc):
+        state = self.db._current.get()
+        try:
+            if state['tx'] is not None:
+                await state['tx'].rollback()  # Nada sin confirmar sobrevive a la solicitud
+        finally:
+            if state['conn'] is not None:
+                await self.db.pool.release(state['conn'])
+            self.db._current.reset(self.token)
+
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+@functools.lru_cache(maxsize=512)
+def _convert(query):
+    """Traduce los placeholders de psycopg2 a los de asyncpg ($1, $2, ...).
+
+    Devuelve (sql, nombres): 'nombres' es la lista de claves en orden para
+    consultas con '%(nombre)s', o None para consultas posicionales.
+    """
+    names = []
+    positional = 0
+
+    def replace(match):
+        nonlocal positional
+        if match.group(0) == '%%':
+            return '%'
+        if match.group(1):
+            name = match.group(1)
+            if name not in names:
+                names.append(name)
+            return f"${names.index(name) + 1}"
+        positional += 1
+        return f"${positional}"
+
+    sql = _PLACEHOLDER.sub(replace, query)
+    return sql, (names if names else None)
+
+
+def to_asyncpg(query, args):
+    """Devuelve (sql, valores) listos para asyncpg a partir de una consulta estilo psycopg2."""
+    sql, names = _convert(query)
+    if names is not None:
+        return sql, [args[name] for name in names]
+    return sql, list(args)
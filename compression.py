@@ -0,0 +1,40 @@
+"""Compresión negociada de respuestas: brotli si está instalado y el cliente lo acepta, si no gzip.
+
+Solo se comprimen tipos de texto (JSON, CSV) a partir de un tamaño mínimo: en
+respuestas chicas el costo de comprimir no compensa lo que se ahorra de red.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional: sin ella solo se ofrece gzip
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/csv', 'text/plain')
+
+
+def supported_encodings():
+    """Codificaciones del servidor, en orden de preferencia."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encodings, encodings=None):
+    """Mejor codificación que acepta el cliente ('request.accept_encodings'), o None.
+
+    'encodings' limita las opciones (ej. ('gzip',) para archivos que ya están en gzip).
+    Una codificación con 'q=0' no se acepta.
+    """
+    best = None
+    best_quality = 0
+    for encoding in encodings or supported_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, level=6):
+    """Comprime 'data' (bytes). 'level' va de 1 a 9 (en brotli se usa como 'quality')."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
@@ -0,0 +1,230 @@
+"""Pool de conexiones PostgreSQL por proceso (uno por worker de Gunicorn).
+
+Reemplaza el 'psycopg2.connect' por solicitud de 'get_db'. El pool usa
+'threading.Condition', así que funciona con workers 'gthread' y también con
+'gevent' (que parchea 'threading' para que las esperas sean cooperativas).
+"""
+import os
+import selectors
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No hubo una conexión libre dentro del tiempo de espera configurado."""
+
+
+def has_pending_input(conn):
+    """True si hay algo para leer en el socket de la conexión (sin esperar).
+
+    Con 'selectors' (epoll/poll): 'select.select' no acepta descriptores >= FD_SETSIZE
+    (1024), que un worker con muchos archivos o sockets abiertos puede tener.
+    """
+    with selectors.DefaultSelector() as selector:
+        selector.register(conn.fileno(), selectors.EVENT_READ)
+        return bool(selector.select(0))
+
+
+class ConnectionPool:
+    """Pool de conexiones con tamaño mínimo/máximo, vida máxima y chequeo de salud.
+
+    - min_size: conexiones que se abren al crear el pool y que se mantienen.
+    - max_size: tope de conexiones abiertas (prestadas + libres).
+    - max_lifetime: segundos tras los cuales una conexión se recicla.
+    - timeout: segundos que 'getconn' espera por una conexión libre.
+    - check_idle: si una conexión estuvo libre más de estos segundos, se
+      verifica con 'SELECT 1' antes de prestarla (0 = en cada préstamo).
+
+    En cada préstamo, sin ida y vuelta al servidor, se descarta la conexión si está
+    cerrada, si no está en reposo (transacción abierta o estado desconocido) o si el
+    servidor ya le escribió algo: una conexión en reposo no recibe nada salvo el aviso
+    de cierre (reinicio de la BD, pg_terminate_backend) o el fin del socket. Un corte de
+    red sin aviso solo lo detecta el 'SELECT 1'; la primera consulta sobre esa conexión
+    fallaría, y por eso check_idle es configurable.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, max_lifetime=3600.0,
+                 timeout=5.0, check_idle=30.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Tamaños de pool inválidos")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.pid = os.getpid()
+
+        self._cond = threading.Condition()
+        self._idle = []        # [(conexión, momento en que quedó libre)]
+        self._created_at = {}  # id(conexión) -> momento de creación
+        self._size = 0         # conexiones abiertas (prestadas + libres)
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+        }
+
+        for _ in range(min_size):
+            conn = self._connect()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    # --- Ciclo de vida de las conexiones ---
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        """Cierra una conexión y libera su lugar en el pool (sin tener el lock)."""
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            self._cond.notify()
+
+    def _expired(self, conn, now):
+        created = self._created_at.get(id(conn), now)
+        return self.max_lifetime is not None and now - created > self.max_lifetime
+
+    def _healthy(self, conn, idle_since, now):
+        if conn.closed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        try:
+            closed_by_server = has_pending_input(conn)
+        except (OSError, ValueError):
+            closed_by_server = True  # Si no se puede revisar el socket, no se presta
+        if closed_by_server:
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+        if self.check_idle is None or now - idle_since < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    # --- API pública ---
+
+    def getconn(self):
+        """Presta una conexión. Lanza 'PoolTimeout' si no hay una libre a tiempo."""
+        deadline = None
+        waited = False
+        start = time.monotonic()
+
+        while True:
+            conn = None
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.OperationalError("El pool está cerrado")
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1  # Reservamos el lugar antes de conectar
+                else:
+                    if deadline is None:
+                        deadline = start + self.timeout
+                        waited = True
+                        self._stats["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        self._stats["wait_time"] += time.monotonic() - start
+                        raise PoolTimeout(
+                            f"No hay conexiones libres tras {self.timeout}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                if self._expired(conn, now) or not self._healthy(conn, idle_since, now):
+                    self._discard(conn)
+                    continue
+
+            with self._cond:
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["wait_time"] += time.monotonic() - start
+            return conn
+
+    def putconn(self, conn):
+        """Devuelve una conexión al pool, descartándola si quedó inservible."""
+        if conn.closed or self._closed or os.getpid() != self.pid:
+            self._discard(conn)
+            return
+        try:
+            # Nunca devolvemos una transacción abierta (ej. un SELECT sin commit)
+            if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        if self._expired(conn, time.monotonic()):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close(self):
+        """Cierra todas las conexiones libres; las prestadas se cierran al devolverse."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Copia de las estadísticas del pool (más el estado actual)."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["size"] = self._size
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._size - len(self._idle)
+        return stats
+
+
+def pool_from_config(config, dsn=None, min_size=None):
+    """Crea un 'ConnectionPool' a partir de 'app.config' (por defecto, hacia DATABASE_URL)."""
+    return ConnectionPool(
+        dsn or config['DATABASE_URL'],
+        min_size=int(config.get('DB_POOL_MIN_SIZE', 1)) if min_size is None else min_size,
+        max_size=int(config.get('DB_POOL_MAX_SIZE', 10)),
+        max_lifetime=float(config.get('DB_POOL_MAX_LIFETIME', 3600)),
+        timeout=float(config.get('DB_POOL_TIMEOUT', 5)),
+        check_idle=float(config.get('DB_POOL_CHECK_IDLE', 30)),
+    )
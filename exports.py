@@ -0,0 +1,136 @@
+"""Exportaciones en segundo plano: 'POST /exports' encola y 'GET /exports/<id>' consulta o descarga.
+
+- La cola es la tabla 'export_jobs'. Un worker toma el próximo trabajo pendiente con
+  CLAIM_QUERY (FOR UPDATE SKIP LOCKED), lo marca 'running' y confirma enseguida: la
+  generación corre fuera de esa transacción y ningún otro worker lo vuelve a tomar.
+- Los workers corren aparte de la app ('flask --app app export-worker'), así una
+  exportación larga no ocupa un worker de Gunicorn.
+- Cada usuario puede tener a lo sumo EXPORT_MAX_ACTIVE_PER_USER trabajos pendientes o
+  en curso; el advisory lock por usuario evita que dos solicitudes simultáneas lo superen.
+- El archivo se guarda comprimido con gzip en EXPORT_DIR y se borra (con su fila) a los
+  EXPORT_TTL segundos. Con varios servidores EXPORT_DIR debe ser un disco compartido.
+- Un trabajo 'running' por más de EXPORT_JOB_TIMEOUT segundos (el worker murió) vuelve a
+  la cola, hasta EXPORT_MAX_ATTEMPTS intentos; 'attempts' evita que el worker viejo, si
+  seguía vivo, pise el resultado del nuevo.
+"""
+import os
+
+# Clave (clase) de los advisory locks por usuario al encolar; la otra mitad es el user_id
+ENQUEUE_LOCK_KEY = 4242018
+
+ENQUEUE_LOCK_QUERY = "SELECT pg_advisory_xact_lock(%s, %s)"
+
+ACTIVE_QUERY = "SELECT count(*) AS active FROM export_jobs WHERE user_id = %s AND status IN ('pending', 'running')"
+
+INSERT_QUERY = """
+INSERT INTO export_jobs (user_id, kind, params) VALUES (%s, %s, %s)
+RETURNING id, status, created_at
+"""
+
+STATUS_QUERY = """
+SELECT id, kind, status, file_path, file_size, error, created_at, finished_at, expires_at
+FROM export_jobs WHERE id = %s AND user_id = %s
+"""
+
+CLAIM_QUERY = """
+UPDATE export_jobs
+SET status = 'running', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP
+WHERE id = (SELECT id FROM export_jobs WHERE status = 'pending' ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED)
+RETURNING id, user_id, kind, params, attempts
+"""
+
+FINISH_QUERY = """
+UPDATE export_jobs
+SET status = 'done', file_path = %s, file_size = %s, finished_at = CURRENT_TIMESTAMP,
+    expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+WHERE id = %s AND status = 'running' AND attempts = %s
+RETURNING id
+"""
+
+FAIL_QUERY = """
+UPDATE export_jobs
+SET status = 'failed', error = %s, finished_at = CURRENT_TIMESTAMP,
+    expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+WHERE id = %s AND status = 'running' AND attempts = %s
+"""
+
+# Trabajos de un worker que murió: vuelven a la cola o, agotados los intentos, fallan
+REQUEUE_QUERY = """
+UPDATE export_jobs
+SET status = CASE WHEN attempts < %(max_attempts)s THEN 'pending' ELSE 'failed' END,
+    error = CASE WHEN attempts < %(max_attempts)s THEN NULL ELSE 'Se agotó el tiempo de la exportación' END,
+    finished_at = CASE WHEN attempts < %(max_attempts)s THEN NULL ELSE CURRENT_TIMESTAMP END,
+    expires_at = CASE WHEN attempts < %(max_attempts)s THEN NULL
+                      ELSE CURRENT_TIMESTAMP + make_interval(secs => %(ttl)s) END
+WHERE status = 'running' AND started_at <= CURRENT_TIMESTAMP - make_interval(secs => %(timeout)s)
+"""
+
+# Un lote de trabajos vencidos; devuelve sus archivos para borrarlos después del commit
+EXPIRE_QUERY = """
+DELETE FROM export_jobs WHERE id = ANY(ARRAY(
+    SELECT id FROM export_jobs WHERE expires_at <= CURRENT_TIMESTAMP
+    LIMIT %s FOR UPDATE SKIP LOCKED))
+RETURNING file_path
+"""
+
+FILE_SUFFIX = '.csv.gz'
+
+
+def job_path(directory, job_id, attempt):
+    """Archivo del trabajo. Cada intento escribe el suyo: un worker colgado no pisa al nuevo."""
+    return os.path.join(directory, f"export_{job_id}_{attempt}{FILE_SUFFIX}")
+
+
+def write_file(path, chunks):
+    """Escribe los bloques (bytes) en 'path' de forma atómica; devuelve el tamaño.
+
+    Se escribe en un temporal y se renombra: una descarga nunca ve un archivo a medias.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.part"
+    size = 0
+    try:
+        with open(partial, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(partial, path)
+    except BaseException:
+        remove_file(partial)
+        raise
+    return size
+
+
+def remove_file(path):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def requeue_stale(conn, timeout, max_attempts, ttl):
+    """Devuelve a la cola los trabajos colgados. Devuelve cuántos encontró."""
+    with conn.cursor() as cursor:
+        cursor.execute(REQUEUE_QUERY, {'timeout': timeout, 'max_attempts': max_attempts, 'ttl': ttl})
+        count = cursor.rowcount
+    conn.commit()
+    return count
+
+
+def cleanup(conn, batch_size=1000, max_batches=None):
+    """Borra los trabajos vencidos y sus archivos, por lotes. Devuelve cuántos borró."""
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with conn.cursor() as cursor:
+            cursor.execute(EXPIRE_QUERY, (batch_size,))
+            paths = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        for path in paths:
+            remove_file(path)
+        deleted += len(paths)
+        batches += 1
+        if len(paths) < batch_size:
+            break
+    return deleted
@@ -0,0 +1,68 @@
+"""Serialización JSON rápida para respuestas grandes.
+
+- Usa orjson si está instalado (dependencia opcional); sin él, el proveedor de
+  JSON de app.py sigue usando el json de la stdlib.
+- Mismo formato que el proveedor por defecto de Flask: claves ordenadas, fechas como
+  fecha HTTP ('Mon, 15 Jan 2024 09:00:00 GMT') y montos Decimal como números.
+- 'dumps_rows' arma el arreglo de objetos directamente desde las tuplas del cursor.
+  Conviene que la consulta ya devuelva tipos nativos de JSON (ej. 'amount::float8' y
+  la fecha formateada con HTTP_DATE_SQL): así orjson no llama a Python por cada valor.
+"""
+import datetime
+import decimal
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin ella se usa la stdlib
+    orjson = None
+
+# Expresión SQL que formatea un TIMESTAMP (UTC, sin zona) igual que 'http_date'.
+# 'Dy' y 'Mon' sin el prefijo TM siempre salen en inglés, sin importar lc_time.
+HTTP_DATE_SQL = "to_char({}, 'Dy, DD Mon YYYY HH24:MI:SS \"GMT\"')"
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def http_date(value):
+    """Igual que 'werkzeug.http.http_date' (las fechas sin zona se toman como UTC), pero sin pasar por 'email.utils'."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc)
+        hour, minute, second = value.hour, value.minute, value.second
+    else:
+        hour = minute = second = 0
+    return (f"{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} "
+            f"{hour:02d}:{minute:02d}:{second:02d} GMT")
+
+
+def default(o):
+    """Tipos que ni orjson ni json serializan como los queremos."""
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, (datetime.date, datetime.datetime)):
+        return http_date(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def available():
+    return orjson is not None
+
+
+def dumps(obj, default=default, sort_keys=True):
+    """Serializa con orjson (en bytes, UTF-8). Requiere 'available()'."""
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=default, option=option)
+
+
+def row_objects(columns, rows):
+    """Objetos (dicts) de cada tupla. Si una fila tiene más valores que 'columns', los
+    sobrantes se ignoran (ej. una columna extra que solo se usa para el cursor de paginación)."""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def dumps_rows(columns, rows, default=default, sort_keys=True):
+    """Arreglo JSON de objetos a partir de tuplas, con orjson; devuelve bytes."""
+    return dumps(row_objects(columns, rows), default=default, sort_keys=sort_keys)
@@ -0,0 +1,211 @@
+"""Pronóstico de ahorro de '/premium_report', vectorizado con NumPy.
+
+- El historial se lee de 'monthly_category_totals' (no de 'transactions'): los últimos
+  HISTORY_MONTHS meses completos quedan en dos matrices categoría x mes (ingresos y
+  gastos), que entran en memoria aunque el usuario tenga años de transacciones.
+- Por categoría se calcula el promedio móvil de ROLLING_MONTHS meses y su variación
+  respecto de la ventana anterior.
+- El ahorro mensual base es el promedio del ahorro neto de los últimos ROLLING_MONTHS
+  meses (los meses sin movimientos cuentan como 0). Si hay al menos SEASONAL_MIN_MONTHS
+  meses de historial se ajusta por estacionalidad: cada mes del año tiene su desvío
+  promedio respecto de la media (aguinaldo en diciembre, vacaciones en enero...), que
+  se descuenta del promedio base y se suma en la proyección.
+- El modelo ('build_model') depende solo del historial; el reporte ('project') le suma
+  el balance actual y las metas, que cambian más seguido y son baratos de aplicar.
+  'forecast-batch' guarda los modelos precalculados en 'forecasts' (ver app.py).
+"""
+import math
+
+import numpy as np
+
+HISTORY_MONTHS = 24
+ROLLING_MONTHS = 3
+SEASONAL_MIN_MONTHS = 24
+HORIZON_MONTHS = 12
+
+# Los totales vienen por moneda: app.py los convierte a BASE_CURRENCY antes de 'build_model'
+HISTORY_QUERY = """
+SELECT month, category, type, currency, total FROM monthly_category_totals
+WHERE user_id = %s AND month >= %s AND month < %s AND tx_count > 0
+"""
+
+
+def month_number(month):
+    """Meses desde el año 0: la diferencia entre dos es la distancia en meses."""
+    return month.year * 12 + month.month - 1
+
+
+def month_label(number):
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def add_months(month, months):
+    number = month_number(month) + months
+    return month.replace(year=number // 12, month=number % 12 + 1, day=1)
+
+
+def history_range(current_month):
+    """(primer mes, mes actual) del historial: los HISTORY_MONTHS meses completos anteriores."""
+    return add_months(current_month, -HISTORY_MONTHS), current_month
+
+
+def load_history(rows, current_month):
+    """Matrices (categorías, ingresos, gastos) de forma [categoría, mes] a partir de HISTORY_QUERY.
+
+    La columna i es el mes 'current - HISTORY_MONTHS + i'; la última, el mes pasado.
+    """
+    categories = sorted({row['category'] for row in rows})
+    income = np.zeros((len(categories), HISTORY_MONTHS))
+    expense = np.zeros((len(categories), HISTORY_MONTHS))
+    if not rows:
+        return categories, income, expense
+
+    first = month_number(current_month) - HISTORY_MONTHS
+    index = {name: i for i, name in enumerate(categories)}
+    rows_idx = np.fromiter((index[row['category']] for row in rows), dtype=np.intp, count=len(rows))
+    cols_idx = np.fromiter((month_number(row['month']) - first for row in rows), dtype=np.intp, count=len(rows))
+    totals = np.fromiter((row['total'] for row in rows), dtype=np.float64, count=len(rows))
+    is_income = np.fromiter((row['type'] == 'income' for row in rows), dtype=bool, count=len(rows))
+    np.add.at(income, (rows_idx[is_income], cols_idx[is_income]), totals[is_income])
+    np.add.at(expense, (rows_idx[~is_income], cols_idx[~is_income]), totals[~is_income])
+    return categories, income, expense
+
+
+def rolling_mean(series, window):
+    """Promedio móvil sobre el último eje: columna j = promedio de las columnas j..j+window-1."""
+    cumulative = np.cumsum(series, axis=-1, dtype=np.float64)
+    cumulative = np.concatenate([np.zeros(series.shape[:-1] + (1,)), cumulative], axis=-1)
+    return (cumulative[..., window:] - cumulative[..., :-window]) / window
+
+
+def seasonal_offsets(net, current_month, history):
+    """Desvío promedio del ahorro neto por mes del año (índice 0 = enero), o ceros si falta historial."""
+    if history < SEASONAL_MIN_MONTHS:
+        return np.zeros(12)
+    recent = net[-history:]
+    calendar_month = (np.arange(-history, 0) + month_number(current_month)) % 12
+    sums = np.bincount(calendar_month, weights=recent, minlength=12)
+    counts = np.bincount(calendar_month, minlength=12)
+    return sums / np.maximum(counts, 1) - recent.mean()
+
+
+def percent_change(previous, current):
+    """Variación porcentual vectorizada; NaN donde el valor anterior es 0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(previous != 0, (current - previous) / np.abs(previous) * 100, np.nan)
+
+
+def build_model(rows, current_month):
+    """Modelo de pronóstico (serializable a JSON) del historial 'rows' (ver HISTORY_QUERY)."""
+    categories, income, expense = load_history(rows, current_month)
+    net = income.sum(axis=0) - expense.sum(axis=0)
+
+    # Meses de historial: desde el primero con movimientos hasta el pasado
+    active = np.flatnonzero(income.any(axis=0) | expense.any(axis=0))
+    history = HISTORY_MONTHS - int(active[0]) if active.size else 0
+
+    offsets = seasonal_offsets(net, current_month, history)
+    last_months = (np.arange(-ROLLING_MONTHS, 0) + month_number(current_month)) % 12
+    baseline = float((net[-ROLLING_MONTHS:] - offsets[last_months]).mean())
+
+    income_avg = rolling_mean(income, ROLLING_MONTHS)
+    expense_avg = rolling_mean(expense, ROLLING_MONTHS)
+    expense_change = percent_change(expense_avg[:, -ROLLING_MONTHS - 1], expense_avg[:, -1])
+    return {
+        "month": month_label(month_number(current_month)),
+        "history_months": history,
+        "baseline": baseline,
+        "seasonal": [float(x) for x in offsets] if history >= SEASONAL_MIN_MONTHS else None,
+        "categories": [
+            {"category": name, "income_avg": round(float(inc), 2), "expense_avg": round(float(exp), 2),
+             "expense_change_pct": None if math.isnan(change) else round(float(change), 2)}
+            for name, inc, exp, change in zip(categories, income_avg[:, -1], expense_avg[:, -1], expense_change)
+            if inc or exp
+        ],
+    }
+
+
+def trajectory(model, balance, current_month):
+    """Balance proyectado al final de cada uno de los HORIZON_MONTHS meses (desde el actual)."""
+    monthly = np.full(HORIZON_MONTHS, model['baseline'])
+    if model['seasonal'] is not None:
+        upcoming = (np.arange(HORIZON_MONTHS) + month_number(current_month)) % 12
+        monthly += np.asarray(model['seasonal'])[upcoming]
+    return float(balance) + np.cumsum(monthly)
+
+
+def months_to_goals(path, balance, baseline, targets):
+    """Meses hasta alcanzar cada meta ('targets'): 0 si ya se alcanzó, None si no se alcanza.
+
+    Dentro del horizonte se usa la trayectoria; después, el ahorro base (la estacionalidad
+    suma 0 en un año).
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    reached = path[None, :] >= targets[:, None]
+    result = []
+    for target, row in zip(targets, reached):
+        if balance >= target:
+            result.append(0)
+        elif row.any():
+            result.append(int(row.argmax()) + 1)
+        elif baseline > 0:
+            result.append(HORIZON_MONTHS + math.ceil((target - path[-1]) / baseline))
+        else:
+            result.append(None)
+    return result
+
+
+def goal_status(goal, months, current_month):
+    """Estado de una meta guardada: cuándo se alcanza y si llega a su 'target_date'."""
+    status = {"id": goal['id'], "name": goal['name'], "target_amount": goal['target_amount'],
+              "target_date": goal['target_date'], "months_to_goal": months,
+              "projected_date": None, "on_track": None}
+    if months is not None:
+        # Se alcanza al final del mes 'months' contando el actual como el primero
+        status["projected_date"] = month_label(month_number(current_month) + max(months - 1, 0))
+    if goal['target_date'] is not None:
+        deadline = month_number(goal['target_date'])
+        status["on_track"] = months is not None and month_number(current_month) + max(months - 1, 0) <= deadline
+    return status
+
+
+def project(model, balance, current_month, goal=None, goals=()):
+    """Cuerpo de '/premium_report': proyección del modelo desde el balance actual.
+
+    'goal' es la meta puntual de '?goal='; 'goals', las metas guardadas del usuario.
+    """
+    baseline = model['baseline']
+    path = trajectory(model, balance, current_month)
+    report = {
+        "message": "Bienvenido a tu reporte premium de Finora!",
+        "average_monthly_savings": round(baseline, 2),
+        "current_balance": balance,
+        "seasonally_adjusted": model['seasonal'] is not None,
+        "projection": {f"{n}_months": round(float(path[n - 1]), 2) for n in (3, 6, 12)},
+        "trajectory": [{"month": month_label(month_number(current_month) + i), "balance": round(float(value), 2)}
+                       for i, value in enumerate(path)],
+        "categories": model['categories'],
+    }
+
+    targets = [goal] if goal is not None else []
+    targets += [g['target_amount'] for g in goals]
+    months = months_to_goals(path, float(balance), baseline, targets)
+    if goals:
+        report["goals"] = [goal_status(g, m, current_month) for g, m in zip(goals, months[len(targets) - len(goals):])]
+
+    if goal is not None:
+        months_to_goal = months[0]
+        if months_to_goal == 0:
+            analysis = "Predicción: Ya alcanzaste tu meta de ahorro."
+        elif months_to_goal is not None:
+            analysis = f"Predicción: A este paso, cumplirás tu meta de ahorro en {months_to_goal} meses."
+        else:
+            analysis = "Predicción: A este paso no alcanzarás tu meta de ahorro; tus gastos superan tus ingresos."
+        report["goal"] = goal
+        report["months_to_goal"] = months_to_goal
+    elif baseline >= 0:
+        analysis = f"Predicción: A este paso ahorrarás {round(float(path[-1]) - float(balance), 2)} en los próximos 12 meses."
+    else:
+        analysis = f"Predicción: A este paso gastarás {round(float(balance) - float(path[-1]), 2)} más de lo que ingresa en 12 meses."
+    report["analysis"] = analysis
+    return report
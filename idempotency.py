@@ -0,0 +1,102 @@
+"""Idempotency-Key para las escrituras de transacciones.
+
+Un cliente que reintenta 'POST /transaction' (o '/transactions/bulk', '/import/csv')
+con el mismo header 'Idempotency-Key' recibe la respuesta guardada de la primera
+vez, sin volver a tocar 'transactions'.
+
+Flujo, en la misma transacción que la escritura:
+1. CLAIM_QUERY inserta la clave. Si otra solicitud con esa clave está en curso, el
+   INSERT espera a que termine; si la clave ya existe (y no expiró) no inserta nada
+   y se responde lo guardado (o 422 si la clave se usó con otra solicitud).
+2. La vista escribe y hace commit: la clave se confirma junto con las filas. Si la
+   vista falla, la clave se descarta con el rollback y el cliente puede reintentar.
+3. STORE_QUERY guarda el status y el cuerpo de la respuesta.
+Si el proceso muere entre 2 y 3, la clave queda sin respuesta (409 hasta que expire).
+
+Las claves expiran a los IDEMPOTENCY_TTL segundos y 'cleanup' las borra por lotes.
+"""
+import hashlib
+import zlib
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Si la clave existe pero expiró (y todavía no se limpió), se reutiliza como nueva
+CLAIM_QUERY = """
+INSERT INTO idempotency_keys (user_id, key_hash, request_hash, expires_at)
+VALUES (%s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+ON CONFLICT (user_id, key_hash) DO UPDATE
+SET request_hash = EXCLUDED.request_hash, status = NULL, response = NULL,
+    created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+WHERE idempotency_keys.expires_at <= CURRENT_TIMESTAMP
+RETURNING user_id
+"""
+
+LOOKUP_QUERY = "SELECT request_hash, status, response FROM idempotency_keys WHERE user_id = %s AND key_hash = %s"
+
+STORE_QUERY = "UPDATE idempotency_keys SET status = %s, response = %s WHERE user_id = %s AND key_hash = %s"
+
+# Un lote de claves expiradas; SKIP LOCKED para no esperar a otro proceso que también limpia
+CLEANUP_QUERY = """
+DELETE FROM idempotency_keys WHERE ctid = ANY(ARRAY(
+    SELECT ctid FROM idempotency_keys WHERE expires_at <= CURRENT_TIMESTAMP
+    LIMIT %s FOR UPDATE SKIP LOCKED))
+"""
+
+
+def validate_key(key):
+    """Lanza ValueError si el valor del header no es una clave válida."""
+    if not key.strip() or len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"'{HEADER}' debe tener entre 1 y {MAX_KEY_LENGTH} caracteres")
+
+
+def key_hash(key):
+    return hashlib.sha256(key.encode('utf-8')).digest()
+
+
+def request_hash(method, path, body):
+    """Huella de la solicitud: la misma clave con otro cuerpo es un error del cliente."""
+    digest = hashlib.sha256(f"{method} {path}\n".encode('utf-8'))
+    digest.update(body)
+    return digest.digest()
+
+
+def multipart_body(files):
+    """Cuerpo a usar en 'request_hash' para un multipart: el boundary cambia en cada envío,
+    así que se usan los archivos. 'files' son pares (campo, contenido en bytes)."""
+    return b"".join(hashlib.sha256(name.encode('utf-8') + b"\0" + content).digest()
+                    for name, content in sorted(files))
+
+
+def encode_body(body):
+    return zlib.compress(body)
+
+
+def decode_body(data):
+    return zlib.decompress(bytes(data))
+
+
+def replay(stored, request_digest):
+    """Qué responder a una clave ya usada: (status, cuerpo en bytes) o (status, dict de error)."""
+    if bytes(stored['request_hash']) != request_digest:
+        return 422, {"error": f"La '{HEADER}' ya se usó con otra solicitud"}
+    if stored['status'] is None:
+        return 409, {"error": f"La solicitud original con esta '{HEADER}' no terminó de procesarse"}
+    return stored['status'], decode_body(stored['response'])
+
+
+def cleanup(conn, batch_size=1000, max_batches=None):
+    """Borra claves expiradas de a 'batch_size', con un commit por lote. Devuelve cuántas borró."""
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with conn.cursor() as cursor:
+            cursor.execute(CLEANUP_QUERY, (batch_size,))
+            count = cursor.rowcount
+        conn.commit()
+        deleted += count
+        batches += 1
+        if count < batch_size:
+            break
+    return deleted
@@ -0,0 +1,209 @@
+"""Métricas de la API en formato de texto de Prometheus, sin dependencias externas.
+
+- Contadores e histogramas con etiquetas, protegidos por un lock por métrica.
+  Registrar una observación es una búsqueda binaria y unas sumas, así que se
+  puede dejar activado en producción.
+- Cada proceso tiene su propio registro: con varios workers de Gunicorn,
+  Prometheus ve el worker que atendió el scrape (igual que la caché local).
+  Sirve para ver distribuciones y tendencias, no para contar exacto entre workers.
+- 'record_query' centraliza lo que se mide de cada sentencia SQL (lo usan el
+  'query_db' de app.py y el de async_db.py), incluido el log de consultas lentas.
+"""
+import bisect
+import functools
+import logging
+import re
+import threading
+
+# Límites (en segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites para conteos (filas por sentencia, sentencias por solicitud)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_logger = logging.getLogger('finora.slow_query')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # etiquetas -> [conteo por bucket..., suma, total]
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, labels=()):
+        with self._lock:
+            state = self._values.get(labels)
+            return state[-1] if state else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, extra=[('le', _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{label_text} {state[-1]}")
+        return lines
+
+
+class Registry:
+    """Conjunto de métricas del proceso más 'collectors' que se evalúan en cada scrape."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """'collect()' devuelve una lista de (nombre, tipo, ayuda, [(etiquetas dict, valor), ...])."""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, type_, documentation, samples in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Tipo de contenido del formato de texto de Prometheus
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = Registry()
+
+QUERY_DURATION = REGISTRY.histogram(
+    'finora_db_query_duration_seconds', "Duración de cada sentencia SQL.", ('endpoint', 'operation'))
+QUERY_ROWS = REGISTRY.histogram(
+    'finora_db_query_rows', "Filas devueltas (o afectadas) por sentencia SQL.", ('endpoint', 'operation'),
+    buckets=ROW_BUCKETS)
+QUERY_ERRORS = REGISTRY.counter(
+    'finora_db_query_errors_total', "Sentencias SQL que terminaron con error.", ('endpoint', 'operation'))
+SLOW_QUERIES = REGISTRY.counter(
+    'finora_db_slow_queries_total', "Sentencias SQL que superaron el umbral de consulta lenta.", ('endpoint',))
+CONNECTION_WAIT = REGISTRY.histogram(
+    'finora_db_connection_wait_seconds', "Tiempo para obtener una conexión a la base de datos.")
+CONNECTION_ERRORS = REGISTRY.counter(
+    'finora_db_connection_errors_total', "Fallos al obtener una conexión a la base de datos.")
+REPLICA_READS = REGISTRY.counter(
+    'finora_db_replica_reads_total',
+    "Conexiones de lectura de rutas de solo lectura, según dónde se leyó (replica, primary, fallback).",
+    ('target',))
+REQUEST_DURATION = REGISTRY.histogram(
+    'finora_http_request_duration_seconds', "Duración de cada solicitud HTTP.", ('endpoint', 'method', 'status'))
+REQUEST_QUERIES = REGISTRY.histogram(
+    'finora_http_request_queries', "Sentencias SQL ejecutadas por solicitud.", ('endpoint',),
+    buckets=COUNT_BUCKETS)
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_operation(query):
+    """Primera palabra de la sentencia en mayúsculas (SELECT, INSERT, WITH...)."""
+    match = re.match(r"\s*(\w+)", query)
+    return match.group(1).upper() if match else 'UNKNOWN'
+
+
+@functools.lru_cache(maxsize=1024)
+def compact_query(query):
+    """La sentencia en una sola línea, para el log."""
+    return " ".join(query.split())
+
+
+def redact_args(args):
+    """Reemplaza los valores de los parámetros por su tipo: el log nunca incluye datos."""
+    if isinstance(args, dict):
+        return {name: type(value).__name__ for name, value in args.items()}
+    return [type(value).__name__ for value in args or ()]
+
+
+def record_query(endpoint, query, args, elapsed, rows=None, error=False, slow_threshold=0):
+    """Registra una sentencia: latencia, filas, errores y, si supera 'slow_threshold' (segundos), el log."""
+    labels = (endpoint, statement_operation(query))
+    QUERY_DURATION.observe(elapsed, labels)
+    if error:
+        QUERY_ERRORS.inc(labels)
+    elif rows is not None and rows >= 0:
+        QUERY_ROWS.observe(rows, labels)
+    if slow_threshold and elapsed >= slow_threshold:
+        SLOW_QUERIES.inc((endpoint,))
+        slow_query_logger.warning("Consulta lenta (%.1f ms) en %s: %s params=%s",
+                                  elapsed * 1000, endpoint, compact_query(query), redact_args(args))
+
+
+def record_request(endpoint, method, status, elapsed, queries):
+    REQUEST_DURATION.observe(elapsed, (endpoint, method, str(status)))
+    REQUEST_QUERIES.observe(queries, (endpoint,))
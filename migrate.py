@@ -0,0 +1,195 @@
+"""Migraciones versionadas del esquema (reemplazan el 'DROP TABLE' de 'init-db').
+
+Cada migración es un archivo en 'migrations/' cuyo nombre empieza con su versión:
+- 'NNNN_nombre.sql': se ejecuta en una transacción junto con el registro de la versión.
+- 'NNNN_nombre.py': define 'upgrade(conn, batch_size, log)' y maneja sus propias
+  transacciones, para poder convertir tablas grandes por lotes sin bloquearlas.
+  Debe poder reanudarse: si se interrumpe, la próxima ejecución la corre de nuevo
+  completa hasta registrarla. Si 'upgrade' acepta 'config', recibe la config de la
+  app (la de 'create_app', o la del entorno vía settings.py si se llama sin ella).
+
+Las versiones aplicadas se guardan en 'schema_migrations'. Un advisory lock
+evita que dos procesos (ej. dos despliegues a la vez) migren en paralelo.
+"""
+import importlib.util
+import inspect
+import os
+import re
+from collections import namedtuple
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Filas por lote en las migraciones que recorren tablas grandes
+DEFAULT_BATCH_SIZE = 10000
+
+# Clave del advisory lock (arbitraria, fija para toda la app)
+MIGRATION_LOCK_KEY = 4242017
+
+Migration = namedtuple('Migration', 'version name path')
+
+_FILENAME = re.compile(r"^(\d+)_(\w+)\.(sql|py)$")
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Migraciones disponibles, ordenadas por versión. Lanza ValueError si hay versiones repetidas."""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Versión de migración repetida: {version}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def ensure_migrations_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+    conn.commit()
+
+
+def applied_versions(conn):
+    ensure_migrations_table(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM schema_migrations")
+        versions = {row[0] for row in cursor.fetchall()}
+    conn.commit()
+    return versions
+
+
+def pending(conn, directory=MIGRATIONS_DIR):
+    """Migraciones todavía no aplicadas, en orden."""
+    done = applied_versions(conn)
+    return [m for m in discover(directory) if m.version not in done]
+
+
+def _load_module(migration):
+    spec = importlib.util.spec_from_file_location(f"migration_{migration.version:04d}", migration.path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _record(cursor, migration):
+    cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                   (migration.version, migration.name))
+
+
+def is_partitioned(conn, table):
+    """True si 'table' es una tabla particionada (ver partitions.py)."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", (table,))
+        partitioned = cursor.fetchone()[0]
+    conn.commit()
+    return partitioned
+
+
+def index_state(cursor, name):
+    """None si el índice no existe; si existe, True si es válido."""
+    cursor.execute("""
+    SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+    """, (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def create_index(conn, name, table, definition, log, unique=False):
+    """Crea un índice (para migraciones .py) sin bloquear las escrituras si se puede.
+
+    Sobre una tabla común usa CONCURRENTLY. Una tabla particionada no lo admite: ahí
+    es un CREATE INDEX normal, que bloquea las escrituras mientras se construye.
+    Si una ejecución anterior se interrumpió, el índice a medias (inválido) se borra
+    y se vuelve a crear.
+    """
+    with conn.cursor() as cursor:
+        state = index_state(cursor, name)
+    conn.commit()
+    if state:
+        return
+    concurrently = '' if is_partitioned(conn, table) else 'CONCURRENTLY '
+    conn.autocommit = True  # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    try:
+        with conn.cursor() as cursor:
+            if state is False:
+                log(f"  Se vuelve a crear {name} (quedó inválido)")
+                cursor.execute(f"DROP INDEX {concurrently}{name}")
+            cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {concurrently}{name} ON {table} {definition}")
+    finally:
+        conn.autocommit = False
+    log(f"  {name} creado")
+
+
+def apply(conn, migration, batch_size=DEFAULT_BATCH_SIZE, log=print, config=None):
+    """Aplica una migración y registra su versión."""
+    if migration.path.endswith('.sql'):
+        with open(migration.path, 'r', encoding='utf-8') as f:
+            sql = f.read()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                _record(cursor, migration)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return
+
+    module = _load_module(migration)
+    kwargs = {}
+    if 'config' in inspect.signature(module.upgrade).parameters:
+        if config is None:
+            import settings  # settings.py importa este módulo
+            config = settings.from_env()
+        kwargs['config'] = config
+    try:
+        module.upgrade(conn, batch_size=batch_size, log=log, **kwargs)
+        with conn.cursor() as cursor:
+            _record(cursor, migration)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def migrate(conn, target=None, batch_size=DEFAULT_BATCH_SIZE, directory=MIGRATIONS_DIR, log=print, config=None):
+    """Aplica en orden las migraciones pendientes (hasta 'target' inclusive). Devuelve las aplicadas.
+
+    'config' es la config de la app, para las migraciones que la usan (ej. BASE_CURRENCY).
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    conn.commit()
+    applied = []
+    try:
+        # Se consulta con el lock tomado: otro proceso pudo haber migrado mientras esperábamos
+        for migration in pending(conn, directory):
+            if target is not None and migration.version > target:
+                break
+            log(f"Aplicando migración {migration.version:04d}_{migration.name}...")
+            apply(conn, migration, batch_size=batch_size, log=log, config=config)
+            applied.append(migration)
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        conn.commit()
+    return applied
+
+
+def reset(conn):
+    """Borra TODAS las tablas del esquema actual (solo para desarrollo y pruebas)."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = current_schema()")
+        tables = [row[0] for row in cursor.fetchall()]
+        if tables:
+            cursor.execute("DROP TABLE IF EXISTS {} CASCADE".format(
+                ", ".join('"{}"'.format(name.replace('"', '""')) for name in tables)))
+    conn.commit()
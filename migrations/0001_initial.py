@@ -0,0 +1,82 @@
+"""Esquema inicial (PostgreSQL), tal como existía antes de las migraciones versionadas.
+
+Usa 'IF NOT EXISTS' para que las bases creadas con el antiguo 'schema.sql'
+puedan registrarse en 'schema_migrations' sin cambios.
+
+Las tablas se crean en una transacción. Los índices de 'transactions' van aparte,
+con 'create_index' (CONCURRENTLY): en una base existente la tabla ya tiene datos y
+un CREATE INDEX normal bloquearía las escrituras mientras se construye.
+
+No se edita: los cambios posteriores van en nuevas migraciones.
+Corre 'flask --app app migrate' (o 'init-db') para aplicarlas.
+"""
+from migrate import create_index
+
+TABLES = """
+-- Tabla de Usuarios (para Autenticación y Roles)
+CREATE TABLE IF NOT EXISTS users (
+id SERIAL PRIMARY KEY,
+username VARCHAR(80) UNIQUE NOT NULL,
+password_hash TEXT NOT NULL,
+role VARCHAR(20) NOT NULL DEFAULT 'user', -- 'user' o 'premium'
+created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabla de Transacciones (Vinculada al usuario)
+CREATE TABLE IF NOT EXISTS transactions (
+id SERIAL PRIMARY KEY,
+user_id INTEGER NOT NULL,
+type TEXT NOT NULL CHECK(type IN ('income', 'expense')),
+amount REAL NOT NULL CHECK(amount > 0),
+category TEXT NOT NULL,
+description TEXT,
+date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+-- Clave foránea que enlaza con la tabla 'users'
+CONSTRAINT fk_user
+    FOREIGN KEY(user_id) 
+    REFERENCES users(id)
+    ON DELETE CASCADE -- Si se borra un usuario, se borran sus transacciones
+
+
+);
+
+-- Totales acumulados por usuario (mantenidos por las rutas de escritura de transacciones)
+-- '/balance' se resuelve con una sola búsqueda por clave primaria.
+-- Para recalcularlos: 'flask --app app rebuild-balances' (o '--verify' para solo revisar)
+CREATE TABLE IF NOT EXISTS user_balances (
+user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+total_income DOUBLE PRECISION NOT NULL DEFAULT 0,
+total_expense DOUBLE PRECISION NOT NULL DEFAULT 0,
+updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Totales por usuario, mes, categoría y tipo (mantenidos por las rutas de escritura)
+-- Alimentan '/reports/summary' y '/premium_report' sin recorrer 'transactions'.
+-- Para recalcularlos: 'flask --app app rebuild-rollups'
+CREATE TABLE IF NOT EXISTS monthly_category_totals (
+user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+month DATE NOT NULL, -- primer día del mes
+category TEXT NOT NULL,
+type TEXT NOT NULL CHECK(type IN ('income', 'expense')),
+total DOUBLE PRECISION NOT NULL DEFAULT 0,
+tx_count INTEGER NOT NULL DEFAULT 0,
+PRIMARY KEY (user_id, month, category, type)
+);
+"""
+
+# Índices para mejorar la velocidad de las consultas comunes
+# (user_id, date DESC, id DESC) cubre el filtro por usuario, el orden de '/transactions'
+# y la paginación por cursor sobre (date, id).
+INDEXES = (
+    ('idx_transactions_user_date_id', "(user_id, date DESC, id DESC)"),
+    ('idx_transactions_date', "(date)"),
+)
+
+
+def upgrade(conn, batch_size, log):
+    with conn.cursor() as cursor:
+        cursor.execute(TABLES)
+    conn.commit()
+    for name, definition in INDEXES:
+        create_index(conn, name, 'transactions', definition, log)
@@ -0,0 +1,204 @@
+"""Montos exactos: REAL / DOUBLE PRECISION -> NUMERIC sin detener la app.
+
+'transactions.amount' (REAL) pasa a NUMERIC(14, 2) en línea:
+1. Se agrega 'amount_numeric' (nullable, instantáneo) y un trigger que la completa
+   en cada INSERT/UPDATE, así la versión anterior de la app puede seguir escribiendo.
+2. Se completa por lotes de 'batch_size' filas, cada lote en su propia transacción.
+3. Se valida un CHECK (amount_numeric IS NOT NULL) sin bloquear escrituras, para que
+   el SET NOT NULL posterior no tenga que recorrer la tabla.
+4. En una transacción corta (con lock_timeout) se intercambian las columnas.
+   La app anterior y la nueva funcionan con ambos tipos de columna.
+
+Los totales ('user_balances' y 'monthly_category_totals', una fila por usuario o
+por usuario/mes/categoría) se convierten con ALTER TYPE y luego se recalculan
+desde 'transactions' por lotes de usuarios: cada lote bloquea las filas de
+balance de esos usuarios, que toda escritura de transacciones también actualiza.
+Las bases creadas con el antiguo 'schema.sql' no tienen filas en 'user_balances':
+se crean aquí para todos los usuarios.
+
+Cada paso revisa el estado actual, así que la migración puede reanudarse.
+"""
+import time
+
+import psycopg2
+import psycopg2.errors
+
+# Espera máxima por el lock exclusivo del intercambio; si se agota, se reintenta
+SWAP_LOCK_TIMEOUT = '5s'
+SWAP_ATTEMPTS = 5
+
+
+def column_type(cursor, table, column):
+    cursor.execute("""
+    SELECT data_type FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def constraint_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s AND connamespace = current_schema()::regnamespace",
+                   (name,))
+    return cursor.fetchone() is not None
+
+
+def prepare_shadow_column(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN IF NOT EXISTS amount_numeric NUMERIC(14, 2)")
+        # REAL -> float8 -> numeric conserva los dígitos que REAL sí guardó (REAL -> numeric redondea a 6)
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION transactions_amount_numeric_sync() RETURNS trigger AS $$
+        BEGIN
+            NEW.amount_numeric := round(NEW.amount::double precision::numeric, 2);
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS transactions_amount_numeric_sync ON transactions")
+        cursor.execute("""
+        CREATE TRIGGER transactions_amount_numeric_sync
+        BEFORE INSERT OR UPDATE OF amount ON transactions
+        FOR EACH ROW EXECUTE FUNCTION transactions_amount_numeric_sync()
+        """)
+    conn.commit()
+
+
+def backfill(conn, batch_size, log):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT min(id), max(id) FROM transactions WHERE amount_numeric IS NULL")
+        low, high = cursor.fetchone()
+    conn.commit()
+    if low is None:
+        return
+    total = 0
+    for start in range(low, high + 1, batch_size):
+        with conn.cursor() as cursor:
+            cursor.execute("""
+            UPDATE transactions SET amount_numeric = round(amount::double precision::numeric, 2)
+            WHERE id >= %s AND id < %s AND amount_numeric IS NULL
+            """, (start, start + batch_size))
+            total += cursor.rowcount
+        conn.commit()
+        log(f"  transactions: {total} filas convertidas (hasta id {min(start + batch_size - 1, high)})")
+
+
+def validate_not_null(conn):
+    with conn.cursor() as cursor:
+        if not constraint_exists(cursor, 'transactions_amount_numeric_not_null'):
+            cursor.execute("""
+            ALTER TABLE transactions ADD CONSTRAINT transactions_amount_numeric_not_null
+            CHECK (amount_numeric IS NOT NULL) NOT VALID
+            """)
+            conn.commit()
+        # VALIDATE toma SHARE UPDATE EXCLUSIVE: las lecturas y escrituras siguen
+        cursor.execute("ALTER TABLE transactions VALIDATE CONSTRAINT transactions_amount_numeric_not_null")
+    conn.commit()
+
+
+def swap_columns(conn, log):
+    for attempt in range(1, SWAP_ATTEMPTS + 1):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+                cursor.execute("LOCK TABLE transactions IN ACCESS EXCLUSIVE MODE")
+                cursor.execute("DROP TRIGGER transactions_amount_numeric_sync ON transactions")
+                cursor.execute("DROP FUNCTION transactions_amount_numeric_sync()")
+                cursor.execute("ALTER TABLE transactions DROP COLUMN amount")  # También borra su CHECK
+                cursor.execute("ALTER TABLE transactions RENAME COLUMN amount_numeric TO amount")
+                cursor.execute("ALTER TABLE transactions ALTER COLUMN amount SET NOT NULL")
+                cursor.execute("ALTER TABLE transactions DROP CONSTRAINT transactions_amount_numeric_not_null")
+                cursor.execute("""
+                ALTER TABLE transactions ADD CONSTRAINT transactions_amount_check CHECK (amount > 0) NOT VALID
+                """)
+            conn.commit()
+            break
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            if attempt == SWAP_ATTEMPTS:
+                raise
+            log(f"  transactions: lock no disponible, reintento {attempt}/{SWAP_ATTEMPTS - 1}")
+            time.sleep(attempt)
+    with conn.cursor() as cursor:
+        cursor.execute("ALTER TABLE transactions VALIDATE CONSTRAINT transactions_amount_check")
+    conn.commit()
+
+
+def convert_totals(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+        if column_type(cursor, 'user_balances', 'total_income') != 'numeric':
+            cursor.execute("""
+            ALTER TABLE user_balances
+            ALTER COLUMN total_income TYPE NUMERIC(16, 2) USING round(total_income::numeric, 2),
+            ALTER COLUMN total_expense TYPE NUMERIC(16, 2) USING round(total_expense::numeric, 2)
+            """)
+        if column_type(cursor, 'monthly_category_totals', 'total') != 'numeric':
+            cursor.execute("""
+            ALTER TABLE monthly_category_totals
+            ALTER COLUMN total TYPE NUMERIC(16, 2) USING round(total::numeric, 2)
+            """)
+    conn.commit()
+
+
+def recompute_totals(conn, batch_size, log):
+    """Recalcula los totales exactos por lotes de usuarios (los REAL acumulaban error).
+
+    Crea la fila de 'user_balances' de los usuarios que no la tienen (bases anteriores
+    a la tabla, que 0001 crea vacía).
+    """
+    last_id = 0
+    done = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM users WHERE id > %s ORDER BY id LIMIT %s", (last_id, batch_size))
+            user_ids = [row[0] for row in cursor.fetchall()]
+            if not user_ids:
+                conn.commit()
+                break
+            # Las escrituras de transacciones actualizan 'user_balances' en su misma transacción:
+            # con estas filas bloqueadas, el recálculo de cada usuario es consistente. Las que
+            # faltan se insertan primero (en 0) para que también queden bloqueadas: una escritura
+            # concurrente espera al commit y suma su monto sobre el total recalculado.
+            cursor.execute("""
+            INSERT INTO user_balances (user_id) SELECT unnest(%s::integer[])
+            ON CONFLICT (user_id) DO NOTHING
+            """, (user_ids,))
+            cursor.execute("SELECT user_id FROM user_balances WHERE user_id = ANY(%s) ORDER BY user_id FOR UPDATE",
+                           (user_ids,))
+            cursor.execute("""
+            INSERT INTO user_balances (user_id, total_income, total_expense)
+            SELECT u.id,
+                   COALESCE(SUM(t.amount) FILTER (WHERE t.type = 'income'), 0),
+                   COALESCE(SUM(t.amount) FILTER (WHERE t.type = 'expense'), 0)
+            FROM users u LEFT JOIN transactions t ON t.user_id = u.id
+            WHERE u.id = ANY(%s) GROUP BY u.id
+            ON CONFLICT (user_id) DO UPDATE
+            SET total_income = EXCLUDED.total_income, total_expense = EXCLUDED.total_expense,
+                updated_at = CURRENT_TIMESTAMP
+            """, (user_ids,))
+            cursor.execute("DELETE FROM monthly_category_totals WHERE user_id = ANY(%s)", (user_ids,))
+            cursor.execute("""
+            INSERT INTO monthly_category_totals (user_id, month, category, type, total, tx_count)
+            SELECT user_id, date_trunc('month', date)::date, category, type, SUM(amount), COUNT(*)
+            FROM transactions WHERE user_id = ANY(%s) GROUP BY 1, 2, 3, 4
+            """, (user_ids,))
+        conn.commit()
+        last_id = user_ids[-1]
+        done += len(user_ids)
+        log(f"  totales recalculados para {done} usuario(s)")
+
+
+def upgrade(conn, batch_size, log):
+    with conn.cursor() as cursor:
+        transactions_done = column_type(cursor, 'transactions', 'amount') == 'numeric'
+    conn.commit()
+
+    if not transactions_done:
+        prepare_shadow_column(conn)
+        backfill(conn, batch_size, log)
+        validate_not_null(conn)
+        swap_columns(conn, log)
+
+    convert_totals(conn)
+    recompute_totals(conn, batch_size, log)
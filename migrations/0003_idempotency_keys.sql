@@ -0,0 +1,18 @@
+/* Claves de idempotencia de las escrituras de transacciones (ver idempotency.py).
+
+Compacta: la clave y la solicitud se guardan como SHA-256 (32 bytes) y el cuerpo
+de la respuesta comprimido. Las filas expiran por 'expires_at' y se borran por lotes.
+*/
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+key_hash BYTEA NOT NULL,
+request_hash BYTEA NOT NULL,
+status SMALLINT,  -- NULL: la escritura se confirmó pero la respuesta no llegó a guardarse
+response BYTEA,
+created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+expires_at TIMESTAMP NOT NULL,
+PRIMARY KEY (user_id, key_hash)
+);
+
+-- Para la limpieza por lotes de las claves expiradas
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
@@ -0,0 +1,7 @@
+/* Versión de los tokens de cada usuario (ver tokens.py).
+
+Los JWT llevan la versión vigente al emitirse; incrementarla ('/logout', cambio de
+rol) revoca todos los tokens anteriores del usuario, de acceso y de refresco.
+Con un DEFAULT constante el ADD COLUMN no reescribe la tabla.
+*/
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,29 @@
+/* Cola de exportaciones en segundo plano (ver exports.py y 'flask --app app export-worker').
+
+Los workers toman los trabajos 'pending' con FOR UPDATE SKIP LOCKED: varios workers
+(hilos o procesos) no se esperan entre sí ni toman el mismo trabajo. El archivo
+generado queda en EXPORT_DIR hasta 'expires_at'; luego se borran el archivo y la fila.
+*/
+CREATE TABLE IF NOT EXISTS export_jobs (
+id BIGSERIAL PRIMARY KEY,
+user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+kind TEXT NOT NULL DEFAULT 'transactions_csv',
+params JSONB NOT NULL DEFAULT '{}',
+status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending', 'running', 'done', 'failed')),
+attempts SMALLINT NOT NULL DEFAULT 0,
+file_path TEXT,
+file_size BIGINT,
+error TEXT,
+created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+started_at TIMESTAMP,
+finished_at TIMESTAMP,
+expires_at TIMESTAMP
+);
+
+-- La cola: solo los pendientes, en orden de llegada
+CREATE INDEX IF NOT EXISTS idx_export_jobs_pending ON export_jobs(id) WHERE status = 'pending';
+-- Límite de trabajos activos por usuario
+CREATE INDEX IF NOT EXISTS idx_export_jobs_user_active ON export_jobs(user_id) WHERE status IN ('pending', 'running');
+-- Trabajos colgados y artefactos vencidos
+CREATE INDEX IF NOT EXISTS idx_export_jobs_started_at ON export_jobs(started_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_export_jobs_expires_at ON export_jobs(expires_at);
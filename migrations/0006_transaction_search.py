@@ -0,0 +1,45 @@
+"""Índices para '/transactions/search' (ver search.py).
+
+- GIN sobre to_tsvector('simple', description): búsqueda de texto completo y por prefijo.
+- GIN de trigramas (pg_trgm) sobre 'description', para la búsqueda aproximada. Es
+  opcional: si la extensión no está disponible (o falta permiso para crearla) se omite
+  y la búsqueda funciona solo por palabras y prefijos.
+
+Sobre una tabla común se crean con CONCURRENTLY, sin bloquear las escrituras. Una
+tabla particionada no lo admite: se crean con CREATE INDEX normal, que bloquea las
+escrituras mientras se construyen (conviene correrla en un momento de poca carga).
+Si se interrumpe, un índice a medias (inválido) se borra y se vuelve a crear.
+"""
+import psycopg2
+
+from migrate import create_index
+
+SEARCH_INDEX = 'idx_transactions_description_search'
+TRIGRAM_INDEX = 'idx_transactions_description_trgm'
+
+
+def enable_trigrams(conn, log):
+    """Crea pg_trgm si está disponible. Devuelve True si quedó instalada."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        available = cursor.fetchone() is not None
+    conn.commit()
+    if not available:
+        log("  pg_trgm no está disponible: se omite la búsqueda aproximada")
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        log(f"  No se pudo crear pg_trgm ({e.pgerror or e}): se omite la búsqueda aproximada")
+        return False
+    return True
+
+
+def upgrade(conn, batch_size, log):
+    create_index(conn, SEARCH_INDEX, 'transactions',
+                 "USING GIN (to_tsvector('simple', coalesce(description, '')))", log)
+    if enable_trigrams(conn, log):
+        create_index(conn, TRIGRAM_INDEX, 'transactions', "USING GIN (description gin_trgm_ops)", log)
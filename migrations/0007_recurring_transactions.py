@@ -0,0 +1,48 @@
+"""Transacciones recurrentes (ver recurring.py).
+
+- Tabla 'recurring_rules' con las reglas de cada usuario y su avance.
+- Columna 'transactions.recurring_rule_id' (NULL en las transacciones comunes). Se agrega
+  sin default: es un cambio de catálogo, no reescribe la tabla.
+- Índice único parcial (recurring_rule_id, date): hace idempotente la materialización.
+  Incluye 'date', así que también sirve si 'transactions' está particionada. Se crea
+  como en la migración 0006 (CONCURRENTLY si la tabla no está particionada).
+
+No hay clave foránea a 'recurring_rules': al borrar una regla sus transacciones quedan
+(son historial del usuario) y validarla recorrería toda la tabla.
+"""
+from migrate import create_index
+
+OCCURRENCE_INDEX = 'idx_transactions_recurring_occurrence'
+
+
+def upgrade(conn, batch_size, log):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS recurring_rules (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        type VARCHAR(10) NOT NULL CHECK (type IN ('income', 'expense')),
+        amount NUMERIC(14, 2) NOT NULL CHECK (amount > 0),
+        category VARCHAR(50) NOT NULL,
+        description TEXT NOT NULL DEFAULT '',
+        frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly', 'yearly')),
+        interval_count INTEGER NOT NULL DEFAULT 1 CHECK (interval_count > 0),
+        start_date TIMESTAMP NOT NULL,
+        end_date TIMESTAMP,
+        occurrences INTEGER NOT NULL DEFAULT 0,
+        next_run TIMESTAMP,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_recurring_rules_user ON recurring_rules (user_id)")
+        # Solo las reglas que siguen generando ocurrencias
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_recurring_rules_next_run ON recurring_rules (next_run)
+        WHERE next_run IS NOT NULL
+        """)
+        cursor.execute("SET LOCAL lock_timeout = '5s'")
+        cursor.execute("ALTER TABLE transactions ADD COLUMN IF NOT EXISTS recurring_rule_id INTEGER")
+    conn.commit()
+
+    create_index(conn, OCCURRENCE_INDEX, 'transactions',
+                 "(recurring_rule_id, date) WHERE recurring_rule_id IS NOT NULL", log, unique=True)
@@ -0,0 +1,24 @@
+/* Metas de ahorro ('/goals') y pronósticos precalculados de '/premium_report' (ver forecast.py).
+
+'forecast-batch' guarda en 'forecasts' el modelo de cada usuario premium. Solo se usa
+si sigue vigente: calculado en el mes actual y con 'data_as_of' igual al 'updated_at'
+de 'user_balances', que cambia con cada escritura de transacciones del usuario.
+*/
+CREATE TABLE IF NOT EXISTS savings_goals (
+id SERIAL PRIMARY KEY,
+user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+name VARCHAR(100) NOT NULL,
+target_amount NUMERIC(14, 2) NOT NULL CHECK (target_amount > 0),
+target_date DATE,
+created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_savings_goals_user ON savings_goals(user_id);
+
+CREATE TABLE IF NOT EXISTS forecasts (
+user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+month DATE NOT NULL,
+data_as_of TIMESTAMP,
+model JSONB NOT NULL,
+computed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
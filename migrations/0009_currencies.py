@@ -0,0 +1,55 @@
+"""Moneda por transacción y tipos de cambio (ver rates.py).
+
+- 'transactions.currency' (y la de 'recurring_rules'): las filas existentes quedan en
+  BASE_CURRENCY. Agregar una columna con un default constante no reescribe la tabla.
+- 'user_balances' y 'monthly_category_totals' pasan a acumular por moneda: la moneda
+  entra en su clave primaria. Son tablas chicas (una fila por usuario o por
+  usuario/mes/categoría), así que se rehacen las claves en una transacción.
+- 'exchange_rates' con las tasas por moneda y fecha, y 'exchange_rate_imports' con una
+  fila por importación (lo que consultan las cachés de tasas para saber si recargar).
+
+BASE_CURRENCY sale de la config de la app (la misma que usa app.py, con lo que
+reemplace 'create_app'): debe ser la moneda en que se registraron las
+transacciones hasta ahora.
+"""
+import re
+
+from psycopg2 import sql
+
+
+def upgrade(conn, batch_size, log, config):
+    base = config['BASE_CURRENCY'].strip().upper()
+    if not re.fullmatch(r"[A-Z]{3}", base):
+        raise ValueError(f"BASE_CURRENCY inválida: '{base}' (código ISO 4217 de tres letras)")
+
+    with conn.cursor() as cursor:
+        cursor.execute("SET LOCAL lock_timeout = '5s'")
+        for table in ('transactions', 'recurring_rules', 'user_balances', 'monthly_category_totals'):
+            cursor.execute(sql.SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS currency VARCHAR(3) NOT NULL DEFAULT {}")
+                           .format(sql.Identifier(table), sql.Literal(base)))
+        cursor.execute("""
+        ALTER TABLE user_balances DROP CONSTRAINT IF EXISTS user_balances_pkey,
+        ADD CONSTRAINT user_balances_pkey PRIMARY KEY (user_id, currency)
+        """)
+        cursor.execute("""
+        ALTER TABLE monthly_category_totals DROP CONSTRAINT IF EXISTS monthly_category_totals_pkey,
+        ADD CONSTRAINT monthly_category_totals_pkey PRIMARY KEY (user_id, month, category, type, currency)
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS exchange_rates (
+        currency VARCHAR(3) NOT NULL,
+        date DATE NOT NULL,
+        rate NUMERIC(20, 10) NOT NULL CHECK (rate > 0),
+        PRIMARY KEY (currency, date)
+        )
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS exchange_rate_imports (
+        id SERIAL PRIMARY KEY,
+        source TEXT,
+        rows INTEGER NOT NULL,
+        imported_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+    conn.commit()
+    log(f"  Transacciones existentes en {base}")
@@ -0,0 +1,325 @@
+"""Particionado opcional de 'transactions' por mes (rango sobre 'date').
+
+Con millones de filas y varios años de historia, las consultas por rango de
+fechas ('/transactions', '/export/csv') y el VACUUM trabajan solo sobre las
+particiones de los meses involucrados.
+
+- 'convert': convierte la tabla existente sin detener la app (copia por lotes
+  con un trigger que replica las escrituras, y un intercambio final corto).
+- 'maintain': crea las particiones de los próximos meses y, opcionalmente,
+  separa (DETACH) las más antiguas y las mueve a un esquema de archivo.
+
+Una partición DEFAULT recibe las filas fuera de los meses creados (ej. una
+importación con fechas antiguas); 'maintain' las mueve a su mes al crearlo.
+Las particiones se llaman 'transactions_pYYYYMM'.
+"""
+import re
+import time
+from datetime import date, datetime
+
+import psycopg2
+import psycopg2.errors
+from psycopg2 import sql
+
+TABLE = 'transactions'
+DEFAULT_PARTITION = 'transactions_default'
+SHADOW_TABLE = 'transactions_partitioned'
+# Nombre con el que queda la tabla original tras 'convert' (se puede borrar después de verificar)
+OLD_TABLE = 'transactions_unpartitioned'
+
+# Espera máxima por locks exclusivos (intercambio y DETACH); si se agota se reintenta
+LOCK_TIMEOUT = '5s'
+LOCK_ATTEMPTS = 5
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned(conn, table=TABLE):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+        SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+        """, (table,))
+        result = cursor.fetchone() is not None
+    conn.commit()
+    return result
+
+
+def list_partitions(conn, table=TABLE):
+    """Particiones mensuales de 'table': lista ordenada de (nombre, desde, hasta). No incluye DEFAULT."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = (SELECT oid FROM pg_class WHERE relname = %s
+                             AND relnamespace = current_schema()::regnamespace)
+        """, (table,))
+        rows = cursor.fetchall()
+    conn.commit()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND.search(bound)
+        if match:
+            partitions.append((name, datetime.fromisoformat(match.group(1)).date(),
+                               datetime.fromisoformat(match.group(2)).date()))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def _with_lock_retries(conn, work, log):
+    """Corre 'work(cursor)' en una transacción con lock_timeout, reintentando si el lock no llega."""
+    for attempt in range(1, LOCK_ATTEMPTS + 1):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+                result = work(cursor)
+            conn.commit()
+            return result
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            if attempt == LOCK_ATTEMPTS:
+                raise
+            log(f"  lock no disponible, reintento {attempt}/{LOCK_ATTEMPTS - 1}")
+            time.sleep(attempt)
+
+
+def create_month_partition(conn, month, table=TABLE, log=print):
+    """Crea la partición del mes y le mueve las filas que hubieran caído en la DEFAULT.
+
+    Se crea como tabla suelta con un CHECK de su rango y luego se adjunta
+    (ATTACH no bloquea las lecturas y el CHECK le evita recorrer la tabla).
+    """
+    lower, upper = month, add_months(month, 1)
+    name = partition_name(month) if table == TABLE else f"{table}_p{month:%Y%m}"
+    default = DEFAULT_PARTITION if table == TABLE else f"{table}_default"
+    check_name = f"{name}_bounds"
+
+    def work(cursor):
+        cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+            sql.Identifier(name), sql.Identifier(table)))
+        cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} CHECK (date >= %s AND date < %s)").format(
+            sql.Identifier(name), sql.Identifier(check_name)), (lower, upper))
+        cursor.execute(sql.SQL("""
+        WITH moved AS (DELETE FROM {} WHERE date >= %s AND date < %s RETURNING *)
+        INSERT INTO {} SELECT * FROM moved
+        """).format(sql.Identifier(default), sql.Identifier(name)), (lower, upper))
+        moved = cursor.rowcount
+        cursor.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(table), sql.Identifier(name)), (lower, upper))
+        cursor.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(
+            sql.Identifier(name), sql.Identifier(check_name)))
+        return moved
+
+    moved = _with_lock_retries(conn, work, log)
+    log(f"Partición {name} creada" + (f" ({moved} fila(s) movidas desde {default})" if moved else ""))
+    return name
+
+
+def ensure_partitions(conn, first_month, last_month, table=TABLE, log=print):
+    """Crea las particiones que falten entre 'first_month' y 'last_month' (inclusive)."""
+    existing = {lower for _, lower, _ in list_partitions(conn, table)}
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        if month not in existing:
+            created.append(create_month_partition(conn, month, table=table, log=log))
+        month = add_months(month, 1)
+    return created
+
+
+def archive_partitions(conn, before_month, archive_schema='archive', log=print):
+    """Separa las particiones que terminan antes de 'before_month' y las mueve a 'archive_schema'.
+
+    Sus filas dejan de aparecer en '/transactions' y '/export/csv', pero siguen
+    contadas en 'user_balances' y 'monthly_category_totals' (no se recalculan).
+    Ojo: 'rebuild-balances' / 'rebuild-rollups' recalculan solo con lo no archivado.
+    """
+    archived = []
+    for name, _, upper in list_partitions(conn):
+        if upper > before_month:
+            continue
+
+        def work(cursor, name=name):
+            cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(archive_schema)))
+            cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                sql.Identifier(TABLE), sql.Identifier(name)))
+            cursor.execute(sql.SQL("ALTER TABLE {} SET SCHEMA {}").format(
+                sql.Identifier(name), sql.Identifier(archive_schema)))
+
+        _with_lock_retries(conn, work, log)
+        log(f"Partición {name} archivada en el esquema '{archive_schema}'")
+        archived.append(name)
+    return archived
+
+
+def maintain(conn, months_ahead=3, retain_months=0, archive_schema='archive', today=None, log=print):
+    """Crea las particiones hasta 'months_ahead' meses adelante y archiva las anteriores a 'retain_months'.
+
+    Con retain_months=0 no se archiva nada. Pensado para correr a diario (cron).
+    Devuelve {"created": [...], "archived": [...]}.
+    """
+    if not is_partitioned(conn):
+        raise RuntimeError("'transactions' no está particionada (ver 'flask --app app partition-transactions')")
+    # Solo del mes actual en adelante: los meses pasados sin partición quedan en la DEFAULT
+    current = month_start(today or date.today())
+    created = ensure_partitions(conn, current, add_months(current, months_ahead), log=log)
+    archived = []
+    if retain_months:
+        archived = archive_partitions(conn, add_months(current, -retain_months + 1), archive_schema, log=log)
+    return {"created": created, "archived": archived}
+
+
+# --- Conversión de una tabla existente ---
+
+_SYNC_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION {SHADOW_TABLE}_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {SHADOW_TABLE} WHERE id = OLD.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {SHADOW_TABLE} SELECT NEW.* ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def _index_definitions(cursor, table, prefix):
+    """Índices de 'table' (sin la clave primaria) cuyo nombre empieza con 'prefix'.
+
+    Devuelve {sufijo: (es_único, 'USING ...')}.
+    """
+    cursor.execute("""
+    SELECT indexname, indexdef FROM pg_indexes
+    WHERE schemaname = current_schema() AND tablename = %s AND starts_with(indexname, %s)
+    """, (table, prefix))
+    return {name[len(prefix):]: (definition.startswith('CREATE UNIQUE'), definition[definition.index(' USING '):].strip())
+            for name, definition in cursor.fetchall() if name != f"{table}_pkey"}
+
+
+def _create_shadow_table(conn, months_ahead, log):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT min(date), max(date) FROM transactions")
+        low, high = cursor.fetchone()
+        cursor.execute(f"""
+        CREATE TABLE {SHADOW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE (date)
+        """)
+        # La clave primaria de una tabla particionada debe incluir la columna de partición
+        cursor.execute(f"ALTER TABLE {SHADOW_TABLE} ADD CONSTRAINT {SHADOW_TABLE}_pkey PRIMARY KEY (id, date)")
+        cursor.execute(f"""
+        ALTER TABLE {SHADOW_TABLE} ADD CONSTRAINT fk_user
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        """)
+        # Los mismos índices 'idx_transactions_*' de la tabla original (los de las migraciones incluidos)
+        for suffix, (unique, definition) in _index_definitions(cursor, TABLE, 'idx_transactions_').items():
+            kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            cursor.execute(f"CREATE {kind} {SHADOW_TABLE}_{suffix} ON {SHADOW_TABLE} {definition}")
+        cursor.execute(f"CREATE TABLE {SHADOW_TABLE}_default PARTITION OF {SHADOW_TABLE} DEFAULT")
+    conn.commit()
+
+    current = month_start(date.today())
+    first = month_start(low) if low else current
+    last = max(month_start(high) if high else current, add_months(current, months_ahead))
+    ensure_partitions(conn, first, last, table=SHADOW_TABLE, log=log)
+
+    with conn.cursor() as cursor:
+        cursor.execute(_SYNC_FUNCTION)
+        cursor.execute(f"""
+        CREATE TRIGGER {SHADOW_TABLE}_sync AFTER INSERT OR UPDATE OR DELETE ON {TABLE}
+        FOR EACH ROW EXECUTE FUNCTION {SHADOW_TABLE}_sync()
+        """)
+    conn.commit()
+
+
+def _copy_rows(conn, batch_size, log):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT min(id), max(id) FROM {TABLE}")
+        low, high = cursor.fetchone()
+    conn.commit()
+    if low is None:
+        return
+    copied = 0
+    for start in range(low, high + 1, batch_size):
+        with conn.cursor() as cursor:
+            # FOR UPDATE: una edición concurrente espera al lote (o el lote a ella y copia su versión final)
+            cursor.execute(f"""
+            INSERT INTO {SHADOW_TABLE}
+            SELECT * FROM {TABLE} WHERE id >= %s AND id < %s FOR UPDATE
+            ON CONFLICT DO NOTHING
+            """, (start, start + batch_size))
+            copied += cursor.rowcount
+        conn.commit()
+        log(f"  {copied} fila(s) copiadas (hasta id {min(start + batch_size - 1, high)})")
+
+
+def _swap(conn, log):
+    partitions = list_partitions(conn, SHADOW_TABLE)
+
+    def work(cursor):
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        suffixes = list(_index_definitions(cursor, SHADOW_TABLE, f"{SHADOW_TABLE}_"))
+        cursor.execute(f"DROP TRIGGER {SHADOW_TABLE}_sync ON {TABLE}")
+        cursor.execute(f"DROP FUNCTION {SHADOW_TABLE}_sync()")
+        # Los nombres de índices son únicos por esquema: la tabla vieja cede los suyos
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+        cursor.execute(f"ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT transactions_pkey TO {OLD_TABLE}_pkey")
+        for suffix in suffixes:
+            cursor.execute(f"ALTER INDEX IF EXISTS idx_transactions_{suffix} RENAME TO {OLD_TABLE}_{suffix}")
+        cursor.execute(f"ALTER TABLE {SHADOW_TABLE} RENAME TO {TABLE}")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {SHADOW_TABLE}_pkey TO transactions_pkey")
+        for suffix in suffixes:
+            cursor.execute(f"ALTER INDEX {SHADOW_TABLE}_{suffix} RENAME TO idx_transactions_{suffix}")
+        cursor.execute(f"ALTER TABLE {SHADOW_TABLE}_default RENAME TO {DEFAULT_PARTITION}")
+        for name, lower, _ in partitions:
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                sql.Identifier(name), sql.Identifier(partition_name(lower))))
+        # La secuencia de 'id' pasa a pertenecer a la tabla nueva (la vieja se puede borrar sin perderla)
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (OLD_TABLE,))
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id")
+
+    _with_lock_retries(conn, work, log)
+
+
+def convert(conn, batch_size=10000, months_ahead=3, log=print):
+    """Convierte 'transactions' en una tabla particionada por mes sin detener la app.
+
+    La tabla original queda como OLD_TABLE (ya sin uso) para verificarla antes de borrarla.
+    Si se interrumpe, volver a ejecutarla continúa la copia. Devuelve False si ya estaba particionada.
+    """
+    if is_partitioned(conn):
+        log("'transactions' ya está particionada.")
+        return False
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (SHADOW_TABLE,))
+        resuming = cursor.fetchone()[0]
+    conn.commit()
+    if resuming:
+        log(f"Continuando una conversión anterior ('{SHADOW_TABLE}' ya existe)")
+    else:
+        _create_shadow_table(conn, months_ahead, log)
+
+    _copy_rows(conn, batch_size, log)
+    _swap(conn, log)
+    with conn.cursor() as cursor:
+        cursor.execute(f"ANALYZE {TABLE}")
+    conn.commit()
+    log(f"'transactions' particionada por mes. La tabla original quedó como '{OLD_TABLE}'.")
+    return True
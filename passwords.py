@@ -0,0 +1,154 @@
+"""Utilidades para el login: pool de hashing, limitador de intentos y caché de verificación.
+
+Todo vive en memoria del proceso (un worker de Gunicorn), sin dependencias externas.
+"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HashPoolBusy(Exception):
+    """Hay demasiados hashes pendientes; conviene responder 503 en lugar de encolar más."""
+
+
+class HashPool:
+    """Ejecuta bcrypt en un pool de hilos acotado.
+
+    bcrypt libera el GIL mientras calcula, así que unos pocos hilos alcanzan para
+    usar los núcleos sin bloquear al resto de las solicitudes. 'max_pending'
+    limita cuántas operaciones pueden estar en cola o en curso a la vez.
+    """
+
+    def __init__(self, max_workers=2, max_pending=32):
+        self.pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def run(self, fn, *args):
+        """Ejecuta 'fn(*args)' en el pool y espera el resultado."""
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolBusy("Demasiadas operaciones de hashing pendientes")
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    async def run_async(self, fn, *args):
+        """Igual que 'run', pero sin bloquear el event loop (modo ASGI)."""
+        import asyncio  # Solo lo usa el modo ASGI: no se carga al iniciar la app WSGI
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolBusy("Demasiadas operaciones de hashing pendientes")
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class LoginRateLimiter:
+    """Bloquea temporalmente un usuario tras varios intentos fallidos.
+
+    - max_attempts: fallos permitidos dentro de 'window' segundos.
+    - lockout: segundos que dura el bloqueo.
+    - max_entries: usuarios recordados como máximo (se olvidan los más antiguos).
+    """
+
+    def __init__(self, max_attempts=5, window=300.0, lockout=300.0, max_entries=10000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.lockout = lockout
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # username -> [fallos, inicio de la ventana, bloqueado hasta]
+
+    def locked_for(self, username):
+        """Segundos que le quedan de bloqueo al usuario (0 si puede intentar)."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return 0
+            return max(0.0, entry[2] - time.monotonic())
+
+    def record_failure(self, username):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or now - entry[1] > self.window:
+                entry = [0, now, 0.0]
+            entry[0] += 1
+            if entry[0] >= self.max_attempts:
+                entry[2] = now + self.lockout
+                entry[0] = 0
+                entry[1] = now
+            self._entries[username] = entry
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def reset(self, username):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class VerificationCache:
+    """Recuerda verificaciones de contraseña exitosas para evitar repetir bcrypt.
+
+    No guarda contraseñas: guarda un HMAC-SHA256 de (usuario, hash, contraseña)
+    con una clave aleatoria del proceso. Si el hash cambia (rehash o cambio de
+    contraseña) la entrada deja de coincidir. Con ttl=0 está desactivada.
+    """
+
+    def __init__(self, ttl=0.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._key = os.urandom(32)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # username -> (digest, expira)
+
+    def _digest(self, username, password_hash, password):
+        msg = "\0".join((username, password_hash, password)).encode('utf-8')
+        return hmac.new(self._key, msg, hashlib.sha256).digest()
+
+    def check(self, username, password_hash, password):
+        if not self.ttl:
+            return False
+        with self._lock:
+            entry = self._entries.get(username)
+        if entry is None or entry[1] < time.monotonic():
+            return False
+        return hmac.compare_digest(entry[0], self._digest(username, password_hash, password))
+
+    def add(self, username, password_hash, password):
+        if not self.ttl:
+            return
+        digest = self._digest(username, password_hash, password)
+        with self._lock:
+            self._entries[username] = (digest, time.monotonic() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, username):
+        with self._lock:
+            self._entries.pop(username, None)
+
+
+def bcrypt_rounds(password_hash):
+    """Costo (log rounds) de un hash bcrypt, ej. '$2b$12$...' -> 12. None si no se reconoce."""
+    parts = password_hash.split('$')
+    if len(parts) < 4:
+        return None
+    try:
+        return int(parts[2])
+    except ValueError:
+        return None
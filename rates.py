@@ -0,0 +1,154 @@
+"""Tipos de cambio para convertir montos entre monedas ('?currency=' de '/balance' y los reportes).
+
+- Se cargan desde un archivo CSV (columnas date, currency, rate) con
+  'flask --app app import-rates', sin consultar servicios externos. 'rate' es cuántas
+  unidades de BASE_CURRENCY vale una unidad de 'currency' ese día; la moneda base vale
+  siempre 1, y entre dos monedas cualesquiera se convierte pasando por ella.
+- Se usa la tasa vigente en la fecha: la última cargada ese día o antes (fines de
+  semana, feriados). Para fechas anteriores a la primera tasa se usa la primera.
+- 'RateTable' guarda en memoria, por moneda, las fechas y tasas ordenadas en arreglos
+  de NumPy: convertir un lote de montos es una búsqueda binaria vectorizada por moneda
+  (np.searchsorted), sin una consulta ni un cálculo en Python por fila.
+- 'RateCache' mantiene la tabla del proceso. Cada importación registra una fila en
+  'exchange_rate_imports'; la caché consulta el último id a lo sumo cada
+  'check_interval' segundos y solo recarga las tasas si cambió.
+"""
+import csv
+import decimal
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+RATES_QUERY = "SELECT currency, date, rate FROM exchange_rates ORDER BY currency, date"
+
+VERSION_QUERY = "SELECT coalesce(max(id), 0) AS version FROM exchange_rate_imports"
+
+UPSERT_QUERY = """
+INSERT INTO exchange_rates (currency, date, rate) VALUES %s
+ON CONFLICT (currency, date) DO UPDATE SET rate = EXCLUDED.rate
+"""
+
+IMPORT_LOG_QUERY = "INSERT INTO exchange_rate_imports (source, rows) VALUES (%s, %s)"
+
+MONEY_QUANTUM = decimal.Decimal('0.01')
+
+
+def read_rates_file(f, parse_currency, base):
+    """Filas (currency, date, rate) de un CSV de tasas. Lanza ValueError indicando la línea inválida.
+
+    Si una moneda y fecha se repite, vale la última línea.
+    """
+    reader = csv.DictReader(f)
+    missing = {'date', 'currency', 'rate'} - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(sorted(missing))}")
+    rows = {}
+    for row in reader:
+        try:
+            currency = parse_currency(row['currency'])
+            if currency == base:
+                raise ValueError(f"La moneda base ({base}) vale siempre 1: no lleva tasas")
+            day = date.fromisoformat(row['date'].strip())
+            rate = decimal.Decimal(row['rate'].strip())
+            if not rate.is_finite() or rate <= 0:
+                raise ValueError("La tasa debe ser un número positivo")
+        except (ValueError, decimal.InvalidOperation, AttributeError) as e:
+            raise ValueError(f"Línea {reader.line_num}: {e}")
+        rows[currency, day] = rate
+    return [(currency, day, rate) for (currency, day), rate in rows.items()]
+
+
+class RateTable:
+    """Tasas de todas las monedas respecto de 'base', en arreglos por moneda."""
+
+    def __init__(self, base, rows=()):
+        """'rows': (currency, date, rate) ordenadas por moneda y fecha (ver RATES_QUERY)."""
+        self.base = base
+        self._series = {}
+        grouped = {}
+        for currency, day, rate in rows:
+            dates, values = grouped.setdefault(currency, ([], []))
+            dates.append(day)
+            values.append(float(rate))
+        for currency, (dates, values) in grouped.items():
+            self._series[currency] = (np.array(dates, dtype='datetime64[D]'), np.array(values))
+        self.currencies = frozenset(self._series) | {base}
+
+    def rates(self, currency, dates):
+        """Tasa de 'currency' (en moneda base) vigente en cada una de 'dates' (datetime64[D])."""
+        if currency == self.base:
+            return np.ones(len(dates))
+        try:
+            known, values = self._series[currency]
+        except KeyError:
+            raise ValueError(f"No hay tipos de cambio para '{currency}'")
+        index = np.searchsorted(known, dates, side='right') - 1
+        return values[np.maximum(index, 0)]
+
+    def factors(self, currencies, dates, target):
+        """Factor por el que se multiplica cada monto para pasarlo de su moneda a 'target'."""
+        currencies = np.asarray(currencies)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        result = np.empty(len(currencies))
+        for currency in np.unique(currencies):
+            mask = currencies == currency
+            result[mask] = self.rates(str(currency), dates[mask])
+        return result / self.rates(target, dates)
+
+    def convert_rows(self, rows, fields, target, dates):
+        """Convierte a 'target', en el lugar, los montos 'fields' de 'rows' (dicts con 'currency').
+
+        'dates' tiene la fecha de la tasa de cada fila. Las filas que ya están en 'target'
+        no se tocan (siguen siendo exactas). Para las demás los factores se buscan en un
+        solo cálculo vectorizado, pero el producto se hace en Decimal: un float64 no
+        conserva los centavos de un NUMERIC(16,2) grande. Se redondea a centavos.
+        Después todas quedan con currency = target.
+        """
+        pending = [i for i, row in enumerate(rows) if row['currency'] != target]
+        if pending:
+            factors = self.factors([rows[i]['currency'] for i in pending], [dates[i] for i in pending], target)
+            # repr de un float es el decimal más corto que lo representa (1.1 y no 1.100000000000000088...)
+            factors = [decimal.Decimal(repr(float(factor))) for factor in factors]
+            for field in fields:
+                for i, factor in zip(pending, factors):
+                    rows[i][field] = (decimal.Decimal(rows[i][field]) * factor).quantize(MONEY_QUANTUM)
+        for row in rows:
+            row['currency'] = target
+        return rows
+
+
+class RateCache:
+    """Tabla de tasas del proceso; se recarga cuando hay una importación nueva."""
+
+    def __init__(self, base, check_interval=30.0):
+        self.check_interval = check_interval
+        self.table = RateTable(base)
+        self.version = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def check_due(self):
+        """True si pasaron 'check_interval' segundos desde la última verificación."""
+        now = time.monotonic()
+        with self._lock:
+            if self._checked is not None and now - self._checked < self.check_interval:
+                return False
+            self._checked = now
+            return True
+
+    def outdated(self, version):
+        return version != self.version
+
+    def load(self, version, rows):
+        """Reemplaza la tabla por las tasas de 'rows' (RATES_QUERY) de la importación 'version'."""
+        table = RateTable(self.table.base, ((r['currency'], r['date'], r['rate']) for r in rows))
+        with self._lock:
+            self.table = table
+            self.version = version
+
+    def invalidate(self):
+        """Fuerza la verificación en el próximo uso (ej. después de importar en este proceso)."""
+        with self._lock:
+            self._checked = None
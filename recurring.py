@@ -0,0 +1,133 @@
+"""Transacciones recurrentes (alquiler, sueldo...): reglas por usuario y su materialización.
+
+- Una regla ('recurring_rules') repite una transacción cada 'interval' días, semanas,
+  meses o años desde 'start_date', hasta 'end_date' si la tiene.
+- La ocurrencia n se calcula siempre desde 'start_date', no sumando a la anterior: una
+  regla mensual del 31 cae el 29 de febrero y vuelve al 31 en marzo.
+- El programador ('flask --app app recurring-scheduler') toma lotes de reglas vencidas
+  ('next_run' <= ahora) con CLAIM_QUERY (FOR UPDATE SKIP LOCKED: se pueden correr varios)
+  e inserta sus ocurrencias en 'transactions' con el mismo INSERT de la carga masiva,
+  así el balance y los totales mensuales se actualizan como con cualquier otra transacción.
+- Es idempotente: cada ocurrencia lleva 'recurring_rule_id' y el índice único
+  (recurring_rule_id, date) descarta la que ya exista. El avance de la regla
+  ('occurrences', 'next_run') se guarda en la misma transacción que las filas.
+- Tras una caída se pone al día con todas las ocurrencias vencidas, hasta MAX_CATCH_UP
+  por regla en cada lote (una regla diaria atrasada años no arma un lote gigante: el
+  resto sale en los lotes siguientes).
+"""
+import calendar
+from datetime import datetime, timedelta
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+
+MAX_INTERVAL = 1000
+
+# Ocurrencias por regla en cada lote del programador
+MAX_CATCH_UP = 1000
+
+COLUMNS = ("id, type, amount, currency, category, description, frequency, interval_count, "
+           "start_date, end_date, occurrences, next_run, created_at")
+
+INSERT_QUERY = f"""
+INSERT INTO recurring_rules
+    (user_id, type, amount, currency, category, description, frequency, interval_count, start_date, end_date,
+     next_run)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+RETURNING {COLUMNS}
+"""
+
+LIST_QUERY = f"SELECT {COLUMNS} FROM recurring_rules WHERE user_id = %s ORDER BY id"
+
+DELETE_QUERY = "DELETE FROM recurring_rules WHERE id = %s AND user_id = %s RETURNING id"
+
+CLAIM_QUERY = """
+SELECT id, user_id, type, amount, currency, category, description, frequency, interval_count,
+       start_date, end_date, occurrences
+FROM recurring_rules
+WHERE next_run <= %s
+ORDER BY next_run
+LIMIT %s
+FOR UPDATE SKIP LOCKED
+"""
+
+# 'next_run' NULL: la regla terminó (pasó su 'end_date')
+ADVANCE_QUERY = "UPDATE recurring_rules SET occurrences = %s, next_run = %s WHERE id = %s"
+
+
+def add_months(value, months):
+    """'value' corrido 'months' meses; el día se ajusta al último del mes si no existe."""
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def occurrence(start, frequency, interval, n):
+    """Fecha de la ocurrencia n (la primera es la 0, en 'start')."""
+    steps = interval * n
+    if frequency == 'daily':
+        return start + timedelta(days=steps)
+    if frequency == 'weekly':
+        return start + timedelta(weeks=steps)
+    if frequency == 'monthly':
+        return add_months(start, steps)
+    return add_months(start, 12 * steps)
+
+
+def next_occurrence(rule, n):
+    """Ocurrencia n de la regla, o None si cae después de su 'end_date'."""
+    when = occurrence(rule['start_date'], rule['frequency'], rule['interval_count'], n)
+    if rule['end_date'] is not None and when > rule['end_date']:
+        return None
+    return when
+
+
+def due_occurrences(rule, now, limit=MAX_CATCH_UP):
+    """Ocurrencias pendientes de la regla hasta 'now' inclusive, a lo sumo 'limit'.
+
+    Devuelve (fechas, occurrences, next_run): el avance a guardar en la regla.
+    """
+    n = rule['occurrences']
+    dates = []
+    when = next_occurrence(rule, n)
+    while when is not None and when <= now and len(dates) < limit:
+        dates.append(when)
+        n += 1
+        when = next_occurrence(rule, n)
+    return dates, n, when
+
+
+def parse_rule(data):
+    """Valida la programación de una regla nueva.
+
+    Devuelve (frequency, interval, start_date, end_date); sin 'start_date', empieza ahora.
+    Lanza ValueError con un mensaje para el cliente si algo es inválido.
+    """
+    frequency = data.get('frequency')
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"La frecuencia debe ser una de: {', '.join(FREQUENCIES)}")
+    try:
+        interval = int(data.get('interval', 1))
+    except (TypeError, ValueError):
+        raise ValueError("El intervalo debe ser un número entero")
+    if not 1 <= interval <= MAX_INTERVAL:
+        raise ValueError(f"El intervalo debe estar entre 1 y {MAX_INTERVAL}")
+
+    try:
+        start_date = datetime.fromisoformat(str(data['start_date'])) if data.get('start_date') else datetime.now()
+        end_date = datetime.fromisoformat(str(data['end_date'])) if data.get('end_date') else None
+    except ValueError:
+        raise ValueError("La fecha debe tener formato ISO (ej. 2024-01-31 12:00:00)")
+    if start_date.tzinfo is not None or (end_date is not None and end_date.tzinfo is not None):
+        raise ValueError("Las fechas no deben incluir zona horaria")
+    if end_date is not None and end_date < start_date:
+        raise ValueError("'end_date' no puede ser anterior a 'start_date'")
+    return frequency, interval, start_date, end_date
+
+
+def rule_json(rule):
+    """Cuerpo JSON de una regla ('interval_count' se expone como 'interval')."""
+    body = dict(rule)
+    body['interval'] = body.pop('interval_count')
+    return body
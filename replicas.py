@@ -0,0 +1,193 @@
+"""Réplicas de lectura de PostgreSQL para las rutas de solo lectura.
+
+- 'ReplicaRouter' tiene un pool por réplica y elige una sana por turnos (round robin).
+  Un hilo en segundo plano revisa cada 'health_interval' segundos que cada réplica
+  responda y que su retraso de replicación no supere 'max_lag'; si una falla al
+  usarla se marca caída en el acto. Sin réplicas sanas se lee del primario.
+- Read-your-writes: después de una escritura el usuario queda "pegado" al primario
+  durante 'sticky_seconds', para que no lea de una réplica que todavía no la aplicó.
+  Conviene que sea mayor que 'max_lag'.
+  - LocalStickiness: en memoria del proceso. Con varios workers de Gunicorn la
+    siguiente solicitud puede caer en otro worker que no vio la escritura: solo
+    para desarrollo y pruebas ('create_app' no arranca con ella si hay réplicas).
+  - RedisStickiness: compartida entre workers (requiere el paquete 'redis'). Es la de
+    por defecto.
+
+Las réplicas no tienen que ser standbys reales: para probar alcanza con dos
+instancias (o dos bases) de PostgreSQL, ej. 'postgresql://...:5433/finora_db'.
+"""
+import threading
+import time
+
+import psycopg2
+
+from db_pool import PoolTimeout, pool_from_config
+
+# Retraso de la réplica en segundos; 0 si no es un standby o si ya aplicó todo lo recibido
+LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class LocalStickiness:
+    """Última escritura de cada usuario, en memoria del proceso."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._lock = threading.Lock()
+        self._until = {}  # usuario -> momento (monotonic) hasta el que lee del primario
+
+    def mark(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            self._until[user_id] = now + self.seconds
+            # Limpieza ocasional para que el dict no crezca con usuarios inactivos
+            if len(self._until) > 10000:
+                self._until = {u: t for u, t in self._until.items() if t > now}
+
+    def is_sticky(self, user_id):
+        with self._lock:
+            until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
+
+
+class RedisStickiness:
+    """Última escritura de cada usuario en Redis, con expiración: la ven todos los workers."""
+
+    def __init__(self, url, seconds, prefix='finora:sticky:'):
+        import redis  # Dependencia opcional: solo hace falta con REPLICA_STICKY_BACKEND=redis
+        self._redis = redis.Redis.from_url(url)
+        self.seconds = seconds
+        self.prefix = prefix
+
+    def mark(self, user_id):
+        self._redis.set(f"{self.prefix}{user_id}", 1, px=max(1, int(self.seconds * 1000)))
+
+    def is_sticky(self, user_id):
+        return bool(self._redis.exists(f"{self.prefix}{user_id}"))
+
+
+class Replica:
+    def __init__(self, pool):
+        self.pool = pool
+        self.healthy = True  # Optimista hasta el primer chequeo; un error la marca caída
+        self.lag = None
+        self.checked_at = None
+
+
+class ReplicaRouter:
+    """Elige la réplica para cada lectura y lleva su estado de salud."""
+
+    def __init__(self, pools, stickiness, health_interval=5.0, max_lag=2.0):
+        self.replicas = [Replica(pool) for pool in pools]
+        self.stickiness = stickiness
+        self.health_interval = health_interval
+        self.max_lag = max_lag
+        self._lock = threading.Lock()
+        self._next = 0
+        self._stop = threading.Event()
+        self._thread = None
+        if health_interval and health_interval > 0:
+            self._thread = threading.Thread(target=self._run, name='replica-health', daemon=True)
+            self._thread.start()
+
+    @property
+    def dsns(self):
+        return [replica.pool.dsn for replica in self.replicas]
+
+    @property
+    def pid(self):
+        return self.replicas[0].pool.pid
+
+    # --- Salud ---
+
+    def check(self, replica):
+        """Consulta la réplica y actualiza su estado. Devuelve True si está sana."""
+        try:
+            conn = replica.pool.getconn()
+        except PoolTimeout:
+            return replica.healthy  # Pool ocupado: la réplica responde, no cambia su estado
+        except psycopg2.Error:
+            healthy, lag = False, None
+        else:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(LAG_QUERY)
+                    lag = float(cursor.fetchone()[0])
+                conn.rollback()
+                healthy = lag <= self.max_lag
+            except psycopg2.Error:
+                healthy, lag = False, None
+            replica.pool.putconn(conn)
+        with self._lock:
+            replica.healthy = healthy
+            replica.lag = lag
+            replica.checked_at = time.monotonic()
+        return healthy
+
+    def check_all(self):
+        for replica in self.replicas:
+            self.check(replica)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check_all()
+            self._stop.wait(self.health_interval)
+
+    def mark_failed(self, pool):
+        """Saca de rotación la réplica de 'pool' hasta el próximo chequeo que la encuentre sana."""
+        with self._lock:
+            for replica in self.replicas:
+                if replica.pool is pool:
+                    replica.healthy = False
+
+    # --- Ruteo ---
+
+    def choose(self, user_id=None):
+        """Pool de la réplica para esta lectura, o None si hay que leer del primario."""
+        if user_id is not None and self.stickiness.is_sticky(user_id):
+            return None
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self._next % len(self.replicas)]
+                self._next += 1
+                if replica.healthy:
+                    return replica.pool
+        return None
+
+    def mark_write(self, user_id):
+        self.stickiness.mark(user_id)
+
+    def close(self):
+        self._stop.set()
+        for replica in self.replicas:
+            replica.pool.close()
+
+    def stats(self):
+        with self._lock:
+            return [{"healthy": r.healthy, "lag": r.lag} for r in self.replicas]
+
+
+def router_from_config(config):
+    """Crea el router según DATABASE_REPLICA_URLS. Devuelve None si no hay réplicas.
+
+    Los pools de las réplicas usan la misma configuración que el del primario, pero no
+    abren conexiones al crearse: una réplica caída no impide que arranque la app.
+    """
+    urls = config.get('DATABASE_REPLICA_URLS') or []
+    if not urls:
+        return None
+    seconds = float(config.get('REPLICA_STICKY_SECONDS', 5))
+    backend_name = config.get('REPLICA_STICKY_BACKEND', 'redis')
+    if backend_name == 'redis':
+        stickiness = RedisStickiness(config['CACHE_REDIS_URL'], seconds)
+    elif backend_name == 'local':
+        stickiness = LocalStickiness(seconds)
+    else:
+        raise ValueError(f"REPLICA_STICKY_BACKEND desconocido: {backend_name}")
+    return ReplicaRouter([pool_from_config(config, dsn=url, min_size=0) for url in urls], stickiness,
+                         health_interval=float(config.get('REPLICA_HEALTH_INTERVAL', 5)),
+                         max_lag=float(config.get('REPLICA_MAX_LAG', 2)))
@@ -0,0 +1,214 @@
+"""Caché de respuestas por usuario con invalidación por versión.
+
+Cada usuario tiene un contador de versión que las rutas de escritura incrementan.
+Las claves de la caché incluyen esa versión, así que al escribir todas las
+respuestas anteriores del usuario quedan inalcanzables (y expiran solas). Un
+contador más, el de ALL_USERS, invalida las de todos (ej. al importar tasas de cambio).
+
+Backends:
+- LocalCacheBackend: LRU en memoria del proceso, con TTL y tamaño máximo.
+  Con varios workers cada uno tiene su propia caché y sus propias versiones,
+  así que un worker puede servir datos de hasta CACHE_TTL segundos de antigüedad:
+  solo sirve con un único proceso, y hay que pedirlo (CACHE_BACKEND=local).
+- RedisCacheBackend: compartido entre workers (requiere el paquete 'redis'). Guarda
+  las respuestas como JSON más los bytes del cuerpo, nunca con pickle: quien pueda
+  escribir en Redis no puede hacer que la app ejecute código al leerlas.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Versión que comparten todas las claves (ver 'ResponseCache.invalidate_all')
+ALL_USERS = 'all'
+
+
+class LocalCacheBackend:
+    """LRU en memoria con expiración por entrada.
+
+    Las versiones por usuario también son un LRU de a lo sumo 'max_versions'. Para que
+    desalojar una no reviva respuestas viejas, cada 'bump_version' toma el siguiente
+    valor de un contador único del proceso, y un usuario sin versión guardada tiene la
+    mayor que se haya desalojado: nunca una que tuvo antes de su última escritura.
+    La de ALL_USERS va aparte y no se desaloja (si no, cada desalojo invalidaría todo).
+    """
+
+    def __init__(self, max_entries=1024, max_versions=None):
+        self.max_entries = max_entries
+        self.max_versions = max_versions or max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # clave -> (valor, expira)
+        self._versions = OrderedDict()  # usuario -> versión
+        self._counter = 0               # última versión asignada
+        self._evicted_version = 0       # versión de los usuarios sin entrada en '_versions'
+        self._all_version = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_version(self, user_id):
+        with self._lock:
+            if user_id == ALL_USERS:
+                return self._all_version
+            version = self._versions.get(user_id)
+            if version is None:
+                return self._evicted_version
+            self._versions.move_to_end(user_id)
+            return version
+
+    def bump_version(self, user_id):
+        with self._lock:
+            self._counter += 1
+            if user_id == ALL_USERS:
+                self._all_version = self._counter
+                return self._counter
+            self._versions[user_id] = self._counter
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > self.max_versions:
+                _, version = self._versions.popitem(last=False)
+                self._evicted_version = max(self._evicted_version, version)
+            return self._counter
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()  # '_counter' sigue: las versiones nuevas no repiten las anteriores
+
+
+def encode_entry(entry):
+    """(status, headers, body, etag) -> bytes: una línea JSON con los metadatos y después el cuerpo."""
+    status, headers, body, etag = entry
+    meta = json.dumps({"status": status, "headers": [list(header) for header in headers], "etag": etag})
+    return meta.encode('utf-8') + b"\n" + body
+
+
+def decode_entry(raw):
+    """Inverso de 'encode_entry'. Lanza ValueError si 'raw' no tiene ese formato."""
+    meta, separator, body = raw.partition(b"\n")
+    if not separator:
+        raise ValueError("Entrada de caché sin separador")
+    meta = json.loads(meta)
+    return meta["status"], [tuple(header) for header in meta["headers"]], body, meta["etag"]
+
+
+class RedisCacheBackend:
+    """Backend compartido sobre Redis. Las versiones usan INCR, así que son globales.
+
+    Los valores son entradas de 'ResponseCache' (ver 'encode_entry').
+    """
+
+    def __init__(self, url, prefix='finora:'):
+        import redis  # Dependencia opcional: solo hace falta con CACHE_BACKEND=redis
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0  # Redis desaloja por su cuenta (maxmemory-policy)
+
+    def get(self, key):
+        raw = self._redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        try:
+            return decode_entry(raw)
+        except (ValueError, KeyError, TypeError):
+            return None  # Escrita por otra versión de la app (o corrupta): se trata como ausente
+
+    def set(self, key, value, ttl):
+        self._redis.set(self.prefix + key, encode_entry(value), ex=max(1, int(ttl)))
+
+    def get_version(self, user_id):
+        raw = self._redis.get(f"{self.prefix}version:{user_id}")
+        return int(raw) if raw is not None else 0
+
+    def bump_version(self, user_id):
+        return self._redis.incr(f"{self.prefix}version:{user_id}")
+
+    def clear(self):
+        for key in self._redis.scan_iter(self.prefix + '*'):
+            self._redis.delete(key)
+
+
+class ResponseCache:
+    """Guarda respuestas completas (status, headers, cuerpo, ETag) por usuario y URL."""
+
+    def __init__(self, backend, ttl=30.0, max_entry_bytes=1024 * 1024):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "skipped": 0, "invalidations": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def key(self, user_id, path):
+        versions = f"{self.backend.get_version(ALL_USERS)}.{self.backend.get_version(user_id)}"
+        return f"resp:{user_id}:{versions}:{path}"
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        self._count("hits" if entry is not None else "misses")
+        return entry
+
+    def set(self, key, entry):
+        """Guarda (status, headers, body, etag) si el cuerpo no supera el tamaño máximo."""
+        if len(entry[2]) > self.max_entry_bytes:
+            self._count("skipped")
+            return False
+        self.backend.set(key, entry, self.ttl)
+        self._count("stores")
+        return True
+
+    def invalidate_user(self, user_id):
+        """Invalida todas las respuestas del usuario (llamar después del commit de una escritura)."""
+        self.backend.bump_version(user_id)
+        self._count("invalidations")
+
+    def invalidate_all(self):
+        """Invalida las respuestas de todos los usuarios. Con Redis lo ven todos los workers."""
+        self.backend.bump_version(ALL_USERS)
+        self._count("invalidations")
+
+    def clear(self):
+        """Descarta todas las entradas y versiones (ej. tras reinicializar la base de datos)."""
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["evictions"] = self.backend.evictions
+        return stats
+
+
+def cache_from_config(config):
+    """Crea la caché según CACHE_BACKEND ('local', 'redis' o 'none'). Devuelve None si está desactivada."""
+    backend_name = config.get('CACHE_BACKEND', 'none')
+    ttl = float(config.get('CACHE_TTL', 30))
+    if backend_name == 'none' or ttl <= 0:
+        return None
+    if backend_name == 'redis':
+        backend = RedisCacheBackend(config['CACHE_REDIS_URL'])
+    elif backend_name == 'local':
+        backend = LocalCacheBackend(max_entries=int(config.get('CACHE_MAX_ENTRIES', 1024)))
+    else:
+        raise ValueError(f"CACHE_BACKEND desconocido: {backend_name}")
+    return ResponseCache(backend, ttl=ttl, max_entry_bytes=int(config.get('CACHE_MAX_ENTRY_BYTES', 1024 * 1024)))
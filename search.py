@@ -0,0 +1,100 @@
+"""Búsqueda de transacciones por descripción ('/transactions/search').
+
+- Texto completo con la configuración 'simple' (sin stemming: las descripciones mezclan
+  idiomas y nombres propios). Cada palabra de la búsqueda se usa como prefijo
+  ('super merc' encuentra "Supermercado Central"), y todas deben aparecer.
+- Búsqueda aproximada con trigramas (pg_trgm), si la migración 0006 pudo crear su
+  índice: encuentra descripciones con errores de tipeo ('supermecado'). Los
+  resultados por palabras siempre quedan antes que los aproximados.
+- Facetas: cuántos resultados hay por categoría, sin aplicar el filtro de categoría
+  (así el cliente puede mostrar las demás). Se calculan solo en la primera página.
+- Paginación por cursor sobre (rank, id), como '/transactions' lo hace sobre (date, id).
+
+DOCUMENT debe coincidir con la expresión del índice GIN para que se use.
+"""
+import base64
+import json
+import re
+
+DOCUMENT = "to_tsvector('simple', coalesce(description, ''))"
+
+TRIGRAM_INDEX_QUERY = "SELECT 1 FROM pg_indexes WHERE indexname = 'idx_transactions_description_trgm'"
+
+MAX_TERMS = 8
+MAX_FACETS = 50
+
+_WORD = re.compile(r"\w+")
+
+
+def parse_terms(text):
+    """Palabras de la búsqueda, en minúsculas. Lanza ValueError si no hay ninguna."""
+    terms = _WORD.findall((text or '').lower())
+    if not terms:
+        raise ValueError("El parámetro 'q' es requerido")
+    if len(terms) > MAX_TERMS:
+        raise ValueError(f"La búsqueda admite hasta {MAX_TERMS} palabras")
+    return terms
+
+
+def prefix_tsquery(terms):
+    """tsquery (texto para to_tsquery) que exige todas las palabras, cada una como prefijo."""
+    # Las palabras son solo caracteres \w: no pueden inyectar operadores de tsquery
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def match_clause(terms, fuzzy):
+    """(condición SQL, args) de las filas que coinciden con la búsqueda."""
+    tsquery = prefix_tsquery(terms)
+    clause = f"{DOCUMENT} @@ to_tsquery('simple', %s)"
+    if not fuzzy:
+        return clause, [tsquery]
+    # 'description %> q': alguna parte de la descripción se parece a 'q' (word_similarity).
+    # El '%' se duplica: la consulta pasa por el formateo de parámetros de psycopg2
+    return f"({clause} OR description %%> %s)", [tsquery, " ".join(terms)]
+
+
+def rank_expression(terms, fuzzy):
+    """(expresión SQL float8, args) del puntaje de cada fila. Mayor es mejor."""
+    tsquery = prefix_tsquery(terms)
+    rank = f"ts_rank({DOCUMENT}, to_tsquery('simple', %s))"
+    if not fuzzy:
+        return f"({rank})::float8", [tsquery]
+    # Coincidir por palabras suma 1: queda por encima de cualquier resultado solo aproximado
+    return (f"({rank} + ({DOCUMENT} @@ to_tsquery('simple', %s))::int "
+            "+ word_similarity(%s, coalesce(description, '')))::float8", [tsquery, tsquery, " ".join(terms)])
+
+
+def build_query(columns, where, where_args, terms, fuzzy, limit, cursor=None):
+    """Consulta de una página de resultados: filas con 'columns' más 'rank', pide limit + 1."""
+    rank, rank_args = rank_expression(terms, fuzzy)
+    match, match_args = match_clause(terms, fuzzy)
+    query = f"SELECT {columns}, {rank} AS rank FROM transactions WHERE {where} AND {match}"
+    args = [*rank_args, *where_args, *match_args]
+    if cursor is not None:
+        query = f"SELECT * FROM ({query}) AS matches WHERE (rank, id) < (%s, %s)"
+        args.extend(cursor)
+    query += " ORDER BY rank DESC, id DESC LIMIT %s"
+    args.append(limit + 1)
+    return query, tuple(args)
+
+
+def build_facets_query(where, where_args, terms, fuzzy):
+    """Conteo de resultados por categoría, de la más frecuente a la menos."""
+    match, match_args = match_clause(terms, fuzzy)
+    query = (f"SELECT category, count(*) AS count FROM transactions WHERE {where} AND {match} "
+             "GROUP BY category ORDER BY count DESC, category LIMIT %s")
+    return query, (*where_args, *match_args, MAX_FACETS)
+
+
+def encode_cursor(rank, id_):
+    raw = json.dumps([rank, id_])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverso de 'encode_cursor': (rank, id). Lanza ValueError si el cursor no es válido."""
+    try:
+        rank, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(rank), int(id_)
+    except Exception:
+        raise ValueError("Cursor inválido")
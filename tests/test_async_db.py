@@ -0,0 +1,24 @@
+import os
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+from async_db import to_asyncpg
+
+
+def test_positional_placeholders():
+    sql, values = to_asyncpg("SELECT * FROM t WHERE a = %s AND b < %s", (1, 2))
+    assert sql == "SELECT * FROM t WHERE a = $1 AND b < $2"
+    assert values == [1, 2]
+
+
+def test_named_placeholders_are_reused():
+    """Un mismo '%(nombre)s' repetido se convierte en el mismo parámetro."""
+    sql, values = to_asyncpg("SELECT %(x)s, %(y)s, %(x)s", {"y": 2, "x": 1})
+    assert sql == "SELECT $1, $2, $1"
+    assert values == [1, 2]
+
+
+def test_escaped_percent():
+    sql, values = to_asyncpg("SELECT 'a%%' || %s", ("b",))
+    assert sql == "SELECT 'a%' || $1"
+    assert values == ["b"]
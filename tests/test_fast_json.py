@@ -0,0 +1,53 @@
+import decimal
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from werkzeug.datastructures import Accept
+from werkzeug.http import http_date, parse_accept_header
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+import compression
+import fast_json
+from app import create_app
+
+app = create_app({"JWT_SECRET_KEY": "finora-clave-de-pruebas-no-usar-en-produccion"})
+
+
+def test_http_date_matches_werkzeug():
+    start = datetime(1999, 12, 31, 23, 59, 58, 999999)
+    for hours in range(0, 24 * 400, 37):
+        value = start + timedelta(hours=hours, seconds=hours)
+        assert fast_json.http_date(value) == http_date(value)
+    aware = datetime(2024, 3, 1, 1, 30, tzinfo=timezone(timedelta(hours=3)))
+    assert fast_json.http_date(aware) == http_date(aware) == 'Thu, 29 Feb 2024 22:30:00 GMT'
+    assert fast_json.http_date(date(2024, 1, 15)) == http_date(date(2024, 1, 15))
+
+
+@pytest.mark.parametrize('encoder', ['auto', 'json'])
+def test_provider_output_is_the_same_json(encoder):
+    payload = {"b": decimal.Decimal('12.10'), "a": [datetime(2024, 1, 15, 9, 0), "ñandú"], "c": None}
+    app.config['JSON_ENCODER'] = encoder
+    try:
+        with app.app_context():
+            text = app.json.dumps(payload)
+            response = app.json.rows_response(['id', 'amount'], [(1, 12.1, 'extra'), (2, 3.0, 'extra')])
+    finally:
+        app.config['JSON_ENCODER'] = 'auto'
+    assert json.loads(text) == {"a": ["Mon, 15 Jan 2024 09:00:00 GMT", "ñandú"], "b": 12.1, "c": None}
+    assert text.index('"a"') < text.index('"b"') < text.index('"c"')  # Claves ordenadas, como Flask
+    assert json.loads(response.get_data()) == [{"amount": 12.1, "id": 1}, {"amount": 3.0, "id": 2}]
+
+
+def test_negotiate_encoding():
+    def accept(header):
+        return parse_accept_header(header, Accept)
+
+    assert compression.negotiate(accept('gzip, deflate')) == 'gzip'
+    assert compression.negotiate(accept('identity')) is None
+    assert compression.negotiate(accept('gzip;q=0')) is None
+    assert compression.negotiate(accept('*')) == compression.supported_encodings()[0]
+    # Archivos que ya están en gzip: solo importa si el cliente acepta gzip
+    assert compression.negotiate(accept('br, gzip'), ('gzip',)) == 'gzip'
+    assert compression.negotiate(accept('gzip;q=0, br'), ('gzip',)) is None
@@ -0,0 +1,63 @@
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+import numpy as np
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+import forecast
+
+CURRENT = date(2024, 7, 1)
+
+
+def monthly_rows(start, months, income, expense, bonus_month=None, bonus=0):
+    """Filas de HISTORY_QUERY: 'income' y 'expense' por mes; 'bonus' extra en 'bonus_month' (1-12)."""
+    rows = []
+    for i in range(months):
+        month = forecast.add_months(start, i)
+        extra = bonus if month.month == bonus_month else 0
+        rows.append({"month": month, "category": "Salario", "type": "income", "total": Decimal(income + extra)})
+        rows.append({"month": month, "category": "Renta", "type": "expense", "total": Decimal(expense)})
+    return rows
+
+
+def test_load_history_and_rolling_mean():
+    rows = monthly_rows(date(2024, 4, 1), 3, 500, 200)
+    rows.append({"month": date(2024, 6, 1), "category": "Renta", "type": "expense", "total": Decimal('50.5')})
+    categories, income, expense = forecast.load_history(rows, CURRENT)
+    assert categories == ["Renta", "Salario"]
+    assert income.shape == (2, forecast.HISTORY_MONTHS)
+    assert list(expense[0, -3:]) == [200, 200, 250.5] and income[0].sum() == 0
+    assert list(forecast.rolling_mean(np.arange(5.0), 3)) == [1, 2, 3]
+
+
+def test_model_without_enough_history_uses_recent_average():
+    model = forecast.build_model(monthly_rows(date(2024, 5, 1), 2, 500, 200), CURRENT)
+    # Tres meses de ventana, uno sin movimientos
+    assert model['history_months'] == 2 and model['seasonal'] is None
+    assert model['baseline'] == 200
+    assert forecast.build_model([], CURRENT)['baseline'] == 0
+
+
+def test_seasonal_adjustment():
+    """Con dos años de historial, el aguinaldo de diciembre se proyecta solo en diciembre."""
+    rows = monthly_rows(forecast.add_months(CURRENT, -24), 24, 1000, 700, bonus_month=12, bonus=1200)
+    model = forecast.build_model(rows, CURRENT)
+    assert model['seasonal'] is not None
+    assert round(model['baseline'], 2) == 400  # 300 por mes + 1200 / 12
+    path = forecast.trajectory(model, 0, CURRENT)
+    monthly = np.diff(np.concatenate([[0], path]))
+    assert np.allclose(monthly[5], 1500) and np.allclose(monthly[:5], 300)  # Diciembre es el sexto mes
+    assert np.isclose(path[-1], 12 * 400)
+
+
+def test_goals():
+    model = forecast.build_model(monthly_rows(date(2024, 4, 1), 3, 500, 200), CURRENT)
+    path = forecast.trajectory(model, 100, CURRENT)
+    assert forecast.months_to_goals(path, 100, model['baseline'], [50, 700, 3700 + 300 * 5]) == [0, 2, 17]
+    assert forecast.months_to_goals(path, 100, -1, [10 ** 6]) == [None]
+
+    goal = {"id": 1, "name": "Auto", "target_amount": 700, "target_date": date(2024, 8, 15)}
+    status = forecast.goal_status(goal, 2, CURRENT)
+    assert status['projected_date'] == '2024-08' and status['on_track'] is True
+    assert forecast.goal_status(goal, 3, CURRENT)['on_track'] is False
@@ -0,0 +1,38 @@
+import os
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+from metrics import Registry, redact_args, statement_operation
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram('test_latency_seconds', "Prueba.", ('endpoint',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, ('a',))
+    histogram.observe(0.5, ('a',))
+    histogram.observe(3.0, ('a',))
+    text = registry.render()
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{endpoint="a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{endpoint="a",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{endpoint="a",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_sum{endpoint="a"} 3.55' in text
+    assert 'test_latency_seconds_count{endpoint="a"} 3' in text
+
+
+def test_counter_and_collectors():
+    registry = Registry()
+    counter = registry.counter('test_errors_total', "Prueba.", ('endpoint',))
+    counter.inc(('a"b',))
+    counter.inc(('a"b',), 2)
+    registry.add_collector(lambda: [('test_pool', 'gauge', "Pool.", [({'state': 'idle'}, 4)])])
+    text = registry.render()
+    assert 'test_errors_total{endpoint="a\\"b"} 3' in text
+    assert 'test_pool{state="idle"} 4' in text
+
+
+def test_statement_operation_and_redaction():
+    assert statement_operation("\n  select 1") == 'SELECT'
+    assert statement_operation("WITH x AS (SELECT 1) SELECT * FROM x") == 'WITH'
+    assert redact_args(("secreto", 42)) == ['str', 'int']
+    assert redact_args({"user_id": 1, "date": None}) == {"user_id": 'int', "date": 'NoneType'}
@@ -0,0 +1,62 @@
+import pytest
+import os
+import sys
+import time
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+from passwords import HashPool, HashPoolBusy, LoginRateLimiter, VerificationCache, bcrypt_rounds
+
+
+def test_rate_limiter_locks_and_resets():
+    """El bloqueo se activa al llegar al máximo de fallos y se limpia con un login exitoso."""
+    limiter = LoginRateLimiter(max_attempts=3, window=60, lockout=60)
+    limiter.record_failure("ana")
+    limiter.record_failure("ana")
+    assert limiter.locked_for("ana") == 0
+    limiter.record_failure("ana")
+    assert limiter.locked_for("ana") > 0
+    assert limiter.locked_for("otro") == 0
+
+    limiter.reset("ana")
+    assert limiter.locked_for("ana") == 0
+
+
+def test_rate_limiter_is_bounded():
+    """El limitador no crece más allá de 'max_entries'."""
+    limiter = LoginRateLimiter(max_entries=10)
+    for i in range(100):
+        limiter.record_failure(f"user{i}")
+    assert len(limiter._entries) == 10
+
+
+def test_verification_cache():
+    """La caché reconoce la misma contraseña y hash, y expira con el TTL."""
+    cache = VerificationCache(ttl=0.05)
+    cache.add("ana", "$2b$04$hash", "secreta")
+    assert cache.check("ana", "$2b$04$hash", "secreta")
+    assert not cache.check("ana", "$2b$04$hash", "otra")
+    assert not cache.check("ana", "$2b$05$nuevo", "secreta")
+    time.sleep(0.06)
+    assert not cache.check("ana", "$2b$04$hash", "secreta")
+
+    disabled = VerificationCache(ttl=0)
+    disabled.add("ana", "$2b$04$hash", "secreta")
+    assert not disabled.check("ana", "$2b$04$hash", "secreta")
+
+
+def test_hash_pool_rejects_when_full():
+    """Con todos los lugares ocupados, el pool rechaza en lugar de encolar."""
+    pool = HashPool(max_workers=1, max_pending=1)
+    assert pool.run(lambda x: x * 2, 21) == 42
+    pool._slots.acquire()
+    try:
+        with pytest.raises(HashPoolBusy):
+            pool.run(lambda: None)
+    finally:
+        pool._slots.release()
+        pool.shutdown()
+
+
+def test_bcrypt_rounds():
+    assert bcrypt_rounds("$2b$12$abcdefghijklmnopqrstuv") == 12
+    assert bcrypt_rounds("texto") is None
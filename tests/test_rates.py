@@ -0,0 +1,69 @@
+import io
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+import numpy as np
+import pytest
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+import rates
+
+ROWS = [
+    ("ARS", date(2024, 1, 1), Decimal('0.001')),
+    ("EUR", date(2024, 1, 1), Decimal('1.10')),
+    ("EUR", date(2024, 2, 1), Decimal('1.20')),
+]
+
+
+def test_rates_use_the_latest_known_date():
+    table = rates.RateTable("USD", ROWS)
+    assert table.currencies == {"USD", "EUR", "ARS"}
+    days = np.array(['2023-12-01', '2024-01-01', '2024-01-31', '2024-02-01', '2024-06-01'], dtype='datetime64[D]')
+    # Antes de la primera tasa se usa la primera
+    assert list(table.rates("EUR", days)) == [1.10, 1.10, 1.10, 1.20, 1.20]
+    assert list(table.rates("USD", days[:2])) == [1, 1]
+    with pytest.raises(ValueError):
+        table.rates("GBP", days)
+
+
+def test_factors_between_two_foreign_currencies():
+    table = rates.RateTable("USD", ROWS)
+    factors = table.factors(["EUR", "USD"], [date(2024, 2, 1)] * 2, "ARS")
+    assert np.allclose(factors, [1200, 1000])
+
+
+def test_convert_rows_keeps_target_amounts_exact():
+    table = rates.RateTable("USD", ROWS)
+    rows = [{"currency": "USD", "total": Decimal('10.01')},
+            {"currency": "EUR", "total": Decimal('10.00')},
+            {"currency": "EUR", "total": Decimal('0.333')}]
+    table.convert_rows(rows, ('total',), "USD", [date(2024, 1, 15), date(2024, 1, 15), date(2024, 3, 1)])
+    assert [row['total'] for row in rows] == [Decimal('10.01'), Decimal('11.00'), Decimal('0.40')]
+    assert {row['currency'] for row in rows} == {"USD"}
+
+    # Montos del máximo de NUMERIC(16,2): en float64 se perderían los centavos
+    rows = [{"currency": "EUR", "total": Decimal('61269331030963.09')}]
+    table.convert_rows(rows, ('total',), "USD", [date(2024, 1, 15)])
+    assert rows[0]['total'] == Decimal('67396264134059.40')  # x 1.10 (en float64 da ...059.41)
+
+
+def test_read_rates_file():
+    f = io.StringIO("date,currency,rate\n2024-01-01,eur,1.1\n2024-01-01,EUR,1.15\n2024-01-02,ARS,0.001\n")
+    rows = rates.read_rates_file(f, str.upper, "USD")
+    assert rows == [("EUR", date(2024, 1, 1), Decimal('1.15')), ("ARS", date(2024, 1, 2), Decimal('0.001'))]
+
+    for content in ("date,currency\n", "date,currency,rate\n2024-01-01,USD,1\n",
+                    "date,currency,rate\n2024-01-01,EUR,-1\n", "date,currency,rate\n01/01/2024,EUR,1\n"):
+        with pytest.raises(ValueError):
+            rates.read_rates_file(io.StringIO(content), str.upper, "USD")
+
+
+def test_rate_cache_reloads_only_on_new_version():
+    cache = rates.RateCache("USD", check_interval=3600)
+    assert cache.check_due() and not cache.check_due()
+    assert cache.outdated(0)
+    cache.load(1, [{"currency": c, "date": d, "rate": r} for c, d, r in ROWS])
+    assert not cache.outdated(1) and "EUR" in cache.table.currencies
+    cache.invalidate()
+    assert cache.check_due()
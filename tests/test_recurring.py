@@ -0,0 +1,47 @@
+import os
+import sys
+from datetime import datetime
+import pytest
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+import recurring
+
+
+def rule(frequency, start, interval=1, end=None, occurrences=0):
+    return {"frequency": frequency, "interval_count": interval, "start_date": start,
+            "end_date": end, "occurrences": occurrences}
+
+
+def test_occurrences_keep_the_start_day():
+    """Las reglas mensuales se calculan desde el inicio: el 31 vuelve después de un mes corto."""
+    start = datetime(2024, 1, 31, 9, 0)
+    assert [recurring.occurrence(start, 'monthly', 1, n).date().isoformat() for n in range(4)] == \
+        ['2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30']
+    assert recurring.occurrence(datetime(2024, 2, 29), 'yearly', 1, 1) == datetime(2025, 2, 28)
+    assert recurring.occurrence(start, 'weekly', 2, 1) == datetime(2024, 2, 14, 9, 0)
+    assert recurring.occurrence(start, 'daily', 3, 2) == datetime(2024, 2, 6, 9, 0)
+
+
+def test_due_occurrences_catch_up_limit_and_end():
+    daily = rule('daily', datetime(2024, 1, 1), occurrences=1)
+    dates, occurrences, next_run = recurring.due_occurrences(daily, datetime(2024, 1, 10), limit=3)
+    assert dates == [datetime(2024, 1, 2), datetime(2024, 1, 3), datetime(2024, 1, 4)]
+    assert (occurrences, next_run) == (4, datetime(2024, 1, 5))  # Sigue vencida: sale en el próximo lote
+
+    ending = rule('monthly', datetime(2024, 1, 15), end=datetime(2024, 2, 20))
+    dates, occurrences, next_run = recurring.due_occurrences(ending, datetime(2024, 6, 1))
+    assert (len(dates), occurrences, next_run) == (2, 2, None)
+
+    assert recurring.due_occurrences(rule('yearly', datetime(2030, 1, 1)), datetime(2024, 1, 1)) == \
+        ([], 0, datetime(2030, 1, 1))
+
+
+def test_parse_rule():
+    assert recurring.parse_rule({"frequency": "weekly", "interval": "2", "start_date": "2024-01-05"}) == \
+        ('weekly', 2, datetime(2024, 1, 5), None)
+    for data in ({"frequency": "hourly"}, {"frequency": "daily", "interval": 0},
+                 {"frequency": "daily", "start_date": "ayer"},
+                 {"frequency": "daily", "start_date": "2024-02-01", "end_date": "2024-01-01"},
+                 {"frequency": "daily", "start_date": "2024-02-01T00:00:00+00:00"}):
+        with pytest.raises(ValueError):
+            recurring.parse_rule(data)
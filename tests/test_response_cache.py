@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+import pickle
+import pytest
+from response_cache import LocalCacheBackend, ResponseCache, cache_from_config, decode_entry, encode_entry
+
+
+def test_local_backend_lru_and_ttl():
+    """El backend local desaloja la entrada menos usada y respeta el TTL."""
+    backend = LocalCacheBackend(max_entries=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    assert backend.get("a") == 1  # 'a' pasa a ser la más reciente
+    backend.set("c", 3, ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.evictions == 1
+
+    backend.set("d", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("d") is None
+
+
+def test_version_bump_invalidates_keys():
+    """Al invalidar un usuario cambian sus claves, pero no las de otros usuarios."""
+    cache = ResponseCache(LocalCacheBackend(), ttl=60)
+    key = cache.key(1, "/balance?")
+    other = cache.key(2, "/balance?")
+    cache.set(key, (200, [], b"{}", "etag"))
+    assert cache.get(cache.key(1, "/balance?")) is not None
+
+    cache.invalidate_user(1)
+    assert cache.key(1, "/balance?") != key
+    assert cache.get(cache.key(1, "/balance?")) is None
+    assert cache.key(2, "/balance?") == other
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['invalidations'] == 1
+
+
+def test_invalidate_all_changes_every_key():
+    cache = ResponseCache(LocalCacheBackend(), ttl=60)
+    keys = [cache.key(1, "/balance?"), cache.key(2, "/balance?")]
+    cache.invalidate_all()
+    assert all(cache.key(user_id, "/balance?") not in keys for user_id in (1, 2))
+
+
+def test_large_entries_are_not_stored():
+    cache = ResponseCache(LocalCacheBackend(), ttl=60, max_entry_bytes=10)
+    assert not cache.set("k", (200, [], b"x" * 11, "etag"))
+    assert cache.stats()['skipped'] == 1
+
+
+def test_cache_from_config_disabled():
+    assert cache_from_config({'CACHE_BACKEND': 'none'}) is None
+    assert cache_from_config({'CACHE_BACKEND': 'local', 'CACHE_TTL': 0}) is None
+    # La caché local es por worker: hay que pedirla
+    assert cache_from_config({}) is None
+    assert isinstance(cache_from_config({'CACHE_BACKEND': 'local'}).backend, LocalCacheBackend)
+
+
+def test_local_versions_are_bounded_without_reviving_old_entries():
+    """Las versiones se desalojan como un LRU, pero un usuario desalojado no vuelve a una versión vieja."""
+    backend = LocalCacheBackend(max_entries=10, max_versions=2)
+    cache = ResponseCache(backend, ttl=60)
+    before_write = cache.key(1, "/balance?")
+    cache.set(before_write, (200, [], b"viejo", "etag"))
+    cache.invalidate_user(1)
+    after_write = cache.key(1, "/balance?")
+    cache.invalidate_user(2)
+    cache.invalidate_user(3)  # Desaloja la versión del usuario 1
+    assert len(backend._versions) == 2
+    # Vuelve a la mayor versión desalojada (la suya tras escribir), no a la de antes de escribir
+    assert cache.key(1, "/balance?") == after_write
+    assert cache.get(cache.key(1, "/balance?")) is None
+    assert cache.key(2, "/balance?").startswith("resp:2:0.")  # Desalojar no cambia la versión global
+    # Un usuario que nunca escribió tampoco reutiliza versiones ya asignadas
+    assert cache.key(4, "/balance?") not in (cache.key(2, "/balance?"), cache.key(3, "/balance?"))
+
+
+def test_redis_entries_are_not_pickled():
+    entry = (200, [("Content-Type", "application/json"), ("Vary", "Accept-Encoding")], b'{"a": 1}\n\x00', "etag")
+    raw = encode_entry(entry)
+    assert raw.startswith(b"{")
+    assert decode_entry(raw) == entry
+    with pytest.raises(ValueError):
+        decode_entry(pickle.dumps(entry))
@@ -0,0 +1,32 @@
+import os
+import sys
+import pytest
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+import search
+from async_db import to_asyncpg
+
+
+def test_parse_terms_and_prefix_tsquery():
+    assert search.parse_terms("Súper  MERC!") == ['súper', 'merc']
+    # Los operadores de tsquery no llegan a la consulta
+    assert search.prefix_tsquery(search.parse_terms("a & !b | c:*")) == "a:* & b:* & c:*"
+    with pytest.raises(ValueError):
+        search.parse_terms("&|!")
+    with pytest.raises(ValueError):
+        search.parse_terms(" ".join("x" * 9))
+
+
+def test_fuzzy_query_placeholders():
+    """El operador '%>' de pg_trgm sobrevive al formateo de psycopg2 y de async_db."""
+    query, args = search.build_query("id", "user_id = %s", [7], ['super'], True, 10, cursor=(1.25, 3))
+    sql, values = to_asyncpg(query, args)
+    assert "description %> $6" in sql and "(rank, id) < ($7, $8)" in sql
+    assert values == ['super:*', 'super:*', 'super', 7, 'super:*', 'super', 1.25, 3, 11]
+
+
+def test_cursor_round_trip():
+    rank = 0.0607927106320858
+    assert search.decode_cursor(search.encode_cursor(rank, 42)) == (rank, 42)
+    with pytest.raises(ValueError):
+        search.decode_cursor("nope")
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+from app import create_app
+
+# Presupuesto de arranque en frío: importar app.py y crear la app (hoy ~0.25 s).
+# Holgado para máquinas de CI lentas; si se pasa, algo pesado volvió a cargarse al importar.
+STARTUP_BUDGET_SECONDS = 1.0
+
+# Se cargan con el primer uso, no al arrancar
+LAZY_MODULES = ('numpy', 'asyncio', 'multiprocessing', 'asyncpg', 'forecast', 'rates', 'redis')
+
+STARTUP_SCRIPT = """
+import json, sys, threading, time
+start = time.perf_counter()
+import app
+created = app.create_app({"JWT_SECRET_KEY": "finora-clave-de-pruebas-no-usar-en-produccion"})
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "threads": threading.active_count(),
+    "pool": app._pool is not None,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def cold_start():
+    output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT], cwd=project_root, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_cold_start_within_budget():
+    # El mejor de tres descarta el ruido de la máquina (caché de disco, otros procesos)
+    runs = [cold_start() for _ in range(3)]
+    assert min(run["seconds"] for run in runs) < STARTUP_BUDGET_SECONDS, runs
+
+
+def test_create_app_defers_per_process_resources():
+    """Crear la app no abre conexiones ni inicia hilos: es seguro antes del fork de los workers."""
+    run = cold_start()
+    assert run["loaded"] == []
+    assert run["threads"] == 1
+    assert not run["pool"]
+
+
+def test_create_app_requires_jwt_secret(monkeypatch):
+    monkeypatch.delenv('JWT_SECRET_KEY', raising=False)
+    monkeypatch.delenv('FLASK_DEBUG', raising=False)
+    with pytest.raises(RuntimeError):
+        create_app()
+    # En desarrollo y pruebas se usa una clave al azar
+    assert len(create_app({"TESTING": True}).config['JWT_SECRET_KEY']) == 64
+
+
+def test_module_app_is_built_on_first_access():
+    """'gunicorn app:app' sigue funcionando, sin que importar el módulo cree la app."""
+    script = ("import app, flask; assert 'app' not in vars(app); "
+              "assert isinstance(app.app, flask.Flask) and app.app is app.app")
+    env = dict(os.environ, JWT_SECRET_KEY="finora-clave-de-pruebas-no-usar-en-produccion")
+    subprocess.run([sys.executable, '-c', script], cwd=project_root, env=env, check=True)
@@ -0,0 +1,146 @@
+"""Revocación de JWT por versión de usuario, sin consultar la BD en cada solicitud.
+
+Cada usuario tiene 'users.token_version'. Los tokens (de acceso y de refresco) llevan
+la versión vigente al emitirse en la claim 'ver'; incrementarla ('/logout', cambio de
+rol) revoca de una vez todos los tokens anteriores del usuario.
+
+- 'TokenVersionCache' guarda en memoria del proceso la versión de los usuarios que
+  tienen solicitudes, así que verificar un token es una búsqueda en un dict. Solo
+  la primera solicitud de cada usuario en el proceso (o una entrada vencida) consulta la BD.
+- 'VersionRefresher' recarga cada 'interval' segundos todas las versiones cacheadas
+  con una sola consulta (BULK_QUERY), en un hilo aparte. Una revocación hecha en otro
+  worker se aplica aquí en a lo sumo 'interval' segundos; en el worker que la hizo, al instante.
+- Conviene que 'interval' sea menor que el TTL de la caché: así las entradas de los
+  usuarios activos no vencen y la consulta nunca queda en el camino de la solicitud.
+
+'/refresh' no usa la caché: verifica la versión y lee el rol actual en la BD, así que
+tras un cambio de rol el cliente obtiene un token con el rol nuevo.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+VERSION_CLAIM = 'ver'
+
+BULK_QUERY = "SELECT id, token_version FROM users WHERE id = ANY(%s)"
+
+REVOKE_QUERY = "UPDATE users SET token_version = token_version + 1 WHERE id = %s RETURNING token_version"
+
+
+def is_revoked(claims, current_version):
+    """True si el token es de una versión anterior (o el usuario ya no existe: 'current_version' None).
+
+    Los tokens emitidos antes de existir 'ver' cuentan como versión 0.
+    """
+    return current_version is None or claims.get(VERSION_CLAIM, 0) != current_version
+
+
+class TokenVersionCache:
+    """Versión de token por usuario, en memoria del proceso, con TTL y tamaño máximo (LRU)."""
+
+    def __init__(self, ttl=15.0, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # usuario -> (versión, vence)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Versión cacheada del usuario, o None si no está o venció."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, user_id, version):
+        with self._lock:
+            self._set(user_id, version, time.monotonic() + self.ttl)
+
+    def _set(self, user_id, version, expires):
+        # Las versiones solo crecen: una recarga que leyó antes de una revocación no la deshace
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            version = max(version, entry[0])
+        self._entries[user_id] = (version, expires)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def user_ids(self):
+        with self._lock:
+            return list(self._entries)
+
+    def update(self, user_ids, versions):
+        """Resultado de una recarga: 'versions' ({usuario: versión}) para los 'user_ids' consultados.
+
+        Los usuarios que ya no existen salen de la caché (su próxima solicitud consulta y falla).
+        """
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for user_id in user_ids:
+                if user_id in versions:
+                    self._set(user_id, versions[user_id], expires)
+                else:
+                    self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def load_versions(conn, user_ids):
+    """Versiones actuales de 'user_ids' en una consulta: {usuario: versión}."""
+    with conn.cursor() as cursor:
+        cursor.execute(BULK_QUERY, (list(user_ids),))
+        rows = cursor.fetchall()
+    conn.rollback()
+    return {row[0]: row[1] for row in rows}
+
+
+class VersionRefresher:
+    """Hilo que recarga las versiones cacheadas cada 'interval' segundos.
+
+    'get_pool' devuelve el pool de psycopg2 a usar (el del primario: una réplica atrasada
+    podría devolver una versión anterior a la revocación).
+    """
+
+    def __init__(self, cache, get_pool, interval=5.0, logger=None):
+        self.cache = cache
+        self.get_pool = get_pool
+        self.interval = interval
+        self.logger = logger
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='token-versions', daemon=True)
+        self._thread.start()
+
+    def refresh(self):
+        user_ids = self.cache.user_ids()
+        if not user_ids:
+            return
+        pool = self.get_pool()
+        conn = pool.getconn()
+        try:
+            versions = load_versions(conn, user_ids)
+        finally:
+            pool.putconn(conn)
+        self.cache.update(user_ids, versions)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:  # BD caída o pool ocupado: las entradas vencen y se consultan de a una
+                if self.logger is not None:
+                    self.logger.warning("No se pudieron recargar las versiones de token: %s", e)
+
+    def stop(self):
+        self._stop.set()